@@ -0,0 +1,116 @@
+import json
+import os
+from HanoiSolver import solveHanoi
+
+# Frame-Stewart algorithm for 4 or more rods: move the top t rings to an intermediate rod
+# using every rod, move the remaining n - t rings to the end rod without the intermediate
+# rod, then move the t rings on top of them. The best split t is found with a DP over
+# (rings, rods), which is memoised in a FrameStewartTable and can be saved to disk
+
+
+def defaultTableFile():
+    # In the user's cache directory, so runs from any directory share it and never write
+    # into the working directory
+    cacheDir = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cacheDir, "hanoi", "frame_stewart.json")
+
+
+class FrameStewartTable:
+    def __init__(self, fileName=None, autoSave=False):
+        # Loads fileName if it exists. Only with autoSave are new entries written back to it
+        # (n, k) -> (moves, split)
+        self.table = {}
+        self.fileName = fileName
+        self.autoSave = autoSave
+        if fileName and os.path.exists(fileName):
+            # The table is only a cache, so a file that can't be read is started again
+            try:
+                self.load(fileName)
+            except (OSError, ValueError) as e:
+                print("WARNING: couldn't load the Frame-Stewart table from '%s', starting empty: %s" % (fileName, e))
+                self.table = {}
+
+    def load(self, fileName):
+        # Raises ValueError if the file isn't a saved table
+        with open(fileName, "r") as inFile:
+            entries = json.load(inFile)
+        if not isinstance(entries, dict):
+            raise ValueError("expected an object of entries")
+        table = {}
+        for key, value in entries.items():
+            try:
+                n, k = (int(v) for v in key.split(","))
+                moves, split = (int(v) for v in value)
+            except TypeError:
+                raise ValueError("bad entry %s: %s" % (key, value))
+            table[(n, k)] = (moves, split)
+        self.table.update(table)
+
+    def save(self, fileName=None):
+        fileName = fileName or self.fileName
+        directory = os.path.dirname(fileName)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(fileName, "w") as outFile:
+            json.dump({"%s,%s" % key: value for key, value in sorted(self.table.items())}, outFile)
+
+    def get(self, n, k):
+        # Returns (moves, split) for n rings on k rods, filling in the table as needed.
+        # Entries for 3 rods use the closed form, with a split of n - 1
+        if k < 3 and n > 1:
+            raise ValueError("%s rings can't be moved with %s rods" % (n, k))
+        if n <= 1:
+            return (n, 0)
+        if k == 3:
+            return ((1 << n) - 1, n - 1)
+        if (n, k) not in self.table:
+            self.fill(n, k)
+        return self.table[(n, k)]
+
+    def fill(self, n, k):
+        # Bottom up over rod counts, so there is no deep recursion for large n
+        for rods in range(4, k + 1):
+            for rings in range(2, n + 1):
+                if (rings, rods) in self.table:
+                    continue
+                best = None
+                for split in range(1, rings):
+                    moves = 2 * self.get(split, rods)[0] + self.get(rings - split, rods - 1)[0]
+                    if best is None or moves < best[0]:
+                        best = (moves, split)
+                self.table[(rings, rods)] = best
+        if self.fileName and self.autoSave:
+            # Nor is failing to save it (e.g. a read only home) fatal
+            try:
+                self.save()
+            except OSError as e:
+                print("WARNING: couldn't save the Frame-Stewart table to '%s': %s" % (self.fileName, e))
+
+    def numMoves(self, n, k):
+        return self.get(n, k)[0]
+
+
+def solveFrameStewart(n, numRods=4, start=1, end=None, table=None):
+    # Yields the (start, end) rods of each move, rods are labelled 1 to numRods
+    if end is None:
+        end = numRods
+    if table is None:
+        table = FrameStewartTable()
+    yield from solveRods(n, list(range(1, numRods + 1)), start, end, table)
+
+
+def solveRods(n, rods, start, end, table):
+    # Moves the top n rings from start to end using the rods in rods
+    if n == 0:
+        return
+    spare = [rod for rod in rods if rod not in (start, end)]
+    if n == 1:
+        yield start, end
+    elif len(rods) == 3:
+        yield from solveHanoi(n, start, end, other=spare[0])
+    else:
+        split = table.get(n, len(rods))[1]
+        middle = spare[0]
+        yield from solveRods(split, rods, start, middle, table)
+        yield from solveRods(n - split, [rod for rod in rods if rod != middle], start, end, table)
+        yield from solveRods(split, rods, middle, end, table)
@@ -0,0 +1,105 @@
+import numpy as np
+
+# View frustum culling of axis aligned bounding boxes, for all the boxes of a frame at once.
+# The frustum's six planes come straight from the rows of projection * view, and a box is
+# outside if it is entirely behind any one of them
+
+
+def extractPlanes(viewProjection):
+    # (6, 4) planes (a, b, c, d), inside where a x + b y + c z + d >= 0, from a row major
+    # projection * view matrix with OpenGL's -w..w clip space: left, right, bottom, top, near, far
+    m = np.asarray(viewProjection, dtype=np.float64)
+    planes = np.array([m[3] + m[0], m[3] - m[0],
+                       m[3] + m[1], m[3] - m[1],
+                       m[3] + m[2], m[3] - m[2]])
+    return planes / np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+
+
+def transformAabbs(matrices, mins, maxs):
+    # World space boxes around (N, 3) local boxes transformed by (N, 4, 4) row major matrices.
+    # The centre is transformed as a point, and each world half extent is the sum of the local
+    # half extents scaled by the absolute values of the matrix row
+    matrices = np.asarray(matrices)
+    centres = (mins + maxs) * 0.5
+    extents = (maxs - mins) * 0.5
+    worldCentres = np.einsum("nij,nj->ni", matrices[:, :3, :3], centres) + matrices[:, :3, 3]
+    worldExtents = np.einsum("nij,nj->ni", np.abs(matrices[:, :3, :3]), extents)
+    return worldCentres - worldExtents, worldCentres + worldExtents
+
+
+def aabbsInFrustum(planes, mins, maxs):
+    # (N,) mask of the boxes at least partly inside the frustum. Only the corner furthest along
+    # each plane's normal is tested, if even that is behind the plane the box is outside. Boxes
+    # near the frustum's corners can pass without being inside, which only costs a draw
+    centres = (mins + maxs) * 0.5
+    extents = (maxs - mins) * 0.5
+    distances = centres @ planes[:, :3].T + planes[:, 3]
+    radii = extents @ np.abs(planes[:, :3]).T
+    return np.all(distances + radii >= 0.0, axis=1)
+
+
+class FrustumCuller:
+    # Culls a frame's objects against the camera, counting how many were drawn and culled.
+    # setViewProjection must be called each frame before culling anything
+    def __init__(self):
+        self.planes = None
+        self.resetCounts()
+
+    def resetCounts(self):
+        self.visibleCount = 0
+        self.culledCount = 0
+
+    def setViewProjection(self, viewProjection):
+        self.planes = extractPlanes(viewProjection)
+
+    def testAabbs(self, mins, maxs):
+        return aabbsInFrustum(self.planes, mins, maxs)
+
+    def cullModels(self, models):
+        # Sets visible and subtreeVisible on every node of the models' hierarchies. The world
+        # boxes of all the nodes are found in one batch, each node's box is then grown to hold
+        # its children's, and a node is drawn if its own box is in view and nothing above it
+        # had its whole subtree culled
+        nodes, parents, matrices = [], [], []
+        for model in models:
+            model.collectNodes(nodes, parents, matrices)
+        if not nodes:
+            return
+        localMins = np.array([node.mesh.aabbMin for node in nodes])
+        localMaxs = np.array([node.mesh.aabbMax for node in nodes])
+        mins, maxs = transformAabbs(np.array(matrices), localMins, localMaxs)
+
+        # Children come after their parents, so going backwards every subtree is complete
+        # before it is added to its parent's
+        subtreeMins, subtreeMaxs = mins.copy(), maxs.copy()
+        for i in range(len(nodes) - 1, -1, -1):
+            parent = parents[i]
+            if parent >= 0:
+                np.minimum(subtreeMins[parent], subtreeMins[i], out=subtreeMins[parent])
+                np.maximum(subtreeMaxs[parent], subtreeMaxs[i], out=subtreeMaxs[parent])
+
+        inside = self.testAabbs(np.concatenate([mins, subtreeMins]), np.concatenate([maxs, subtreeMaxs]))
+        for i, node in enumerate(nodes):
+            parent = parents[i]
+            node.subtreeVisible = bool(inside[len(nodes) + i]) and (parent < 0 or nodes[parent].subtreeVisible)
+            node.visible = node.subtreeVisible and bool(inside[i])
+            if node.visible:
+                self.visibleCount += 1
+            else:
+                self.culledCount += 1
+
+    def cullInstances(self, instancedModel):
+        # (N,) mask of which of the instances are in view, from the transform store's matrices
+        mesh = instancedModel.mesh
+        matrices = instancedModel.transforms.matrices[instancedModel.indices]
+        count = len(matrices)
+        mins, maxs = transformAabbs(matrices, np.broadcast_to(mesh.aabbMin, (count, 3)),
+                                    np.broadcast_to(mesh.aabbMax, (count, 3)))
+        visible = self.testAabbs(mins, maxs)
+        visibleCount = int(np.count_nonzero(visible))
+        self.visibleCount += visibleCount
+        self.culledCount += count - visibleCount
+        return visible
+
+    def report(self):
+        return "%d visible, %d culled" % (self.visibleCount, self.culledCount)
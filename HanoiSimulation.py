@@ -0,0 +1,393 @@
+from itertools import islice
+from math import ceil
+import numpy as np
+from FrameStewart import FrameStewartTable, defaultTableFile, solveFrameStewart
+from HanoiSolver import decodeMoves, distanceFrom, getConfiguration, getConfigurationFrom, solveFrom
+from MoveFile import MoveFileReader
+from RodState import RodState, validateCodes, validateMoveFile, validateMoves
+from Trajectory import Trajectory
+from TransformStore import TransformStore
+
+# Models used for the scene, the renderer loads these and the simulation reads their bounds
+TABLE_MODEL = 'objects/table.obj'
+ROD_MODEL = 'objects/rod.obj'
+ROD_SCALE = 2.0
+RING_MODELS = ('objects/metal_torus.obj', 'objects/torus.obj')
+# Gap left between a lifted ring and the top of the tallest stack
+LIFT_CLEARANCE = 0.2
+
+
+def loadObjBounds(fileName):
+    # Reads just the vertex positions of an OBJ file and returns their (min, max), so
+    # sizes are known without creating the model and its GL resources
+    with open(fileName, "r") as inFile:
+        positions = [l.split()[1:4] for l in inFile if l.startswith("v ")]
+    npPos = np.array(positions, dtype=np.float32)
+    return npPos.min(0), npPos.max(0)
+
+
+def getRingModel(ring):
+    # Rings go from largest to smallest, alternating metal and wood
+    return RING_MODELS[ring % 2]
+
+
+def getRingScale(ring, numRings):
+    # Rings shrink evenly down to just over half the largest, however many there are
+    return 1 - 0.5 * ring / numRings
+
+
+class HanoiSimulation:
+    # Puzzle state, move scheduling and ring kinematics, with no window or GL context.
+    # The renderer only reads the ring transforms (and the layout) each frame, so the same
+    # simulation can run headless for tests and benchmarks
+
+    def __init__(self, numRings=5, numRods=3, moveFile=None, playbackDuration=None, transforms=None,
+                 frameStewart=None):
+        # Play the moves from a move file instead of solving
+        self.moveFile = None
+        self.startRod = 1
+        self.endRod = numRods
+        if moveFile:
+            self.moveFile = MoveFileReader(moveFile)
+            numRings = self.moveFile.numRings
+            numRods = self.moveFile.numRods
+            self.startRod = self.moveFile.start
+            self.endRod = self.moveFile.end
+
+        self.numRings = numRings
+        self.numRods = numRods
+        # Seeking can use the closed form configuration only when the moves are the optimal
+        # 3 rod solution, otherwise moves are replayed. A move file is only taken as optimal if
+        # its header says so, nothing is scanned at start-up. Its moves are checked as they
+        # are played instead, and playing stops at the first illegal one, see getFileMoves
+        self.closedForm = numRods == 3
+        if self.moveFile:
+            self.closedForm = self.closedForm and self.moveFile.optimal
+            self.fileMoves = len(self.moveFile)
+            # State after the file's moves, once a seek or playback has got there
+            self.fileEnd = None
+        # Optimal splits for more than 3 rods. By default splits saved by earlier runs are
+        # loaded but nothing is written, pass a table with autoSave to save new ones
+        if frameStewart is None:
+            frameStewart = FrameStewartTable(defaultTableFile())
+        self.frameStewart = frameStewart
+
+        # playing animation
+        self.playing = False
+
+        # Stream of (start, end) moves from the solver, pulled one at a time as the animation plays
+        self.solution = None
+        # Move being animated as (start, end, ring, trajectory), and how far along it we are
+        self.currentMove = None
+        self.moveTime = 0.0
+        # Ring speed in units per second, and the playback speed multiplier
+        self.ringSpeed = 1.0
+        self.speed = 1.0
+        self.minSpeed = 1.0
+        self.maxSpeed = 10000.0
+
+        # The simulation runs in fixed steps, decoupled from the frame rate. The accumulator
+        # holds simulated time not yet stepped, and the step count per frame is capped so
+        # a slow frame can't snowball into ever more steps
+        self.simStep = 1 / 120
+        self.accumulator = 0.0
+        self.maxStepsPerFrame = 100000
+
+        # Turbo playback commits a whole batch of moves every frame, and shows the move after
+        # the batch turboMoveFraction of the way along its trajectory, so a ring is always seen
+        # in flight. The batch size is turboMoves, or if turboDuration is set, whatever plays
+        # the whole solution in that many seconds. The last move of the solution is animated
+        # at the playback speed
+        self.turbo = False
+        self.turboMoves = 1000
+        self.turboDuration = None
+        self.turboMoveFraction = 0.5
+        # Timeline position, the number of moves completed so far
+        self.moveIndex = 0
+        if self.moveFile:
+            # With 3 rods the puzzle is finished optimally from wherever the file's moves leave
+            # it, and those moves are counted once playback gets there, see getSolution
+            self.numMoves = self.fileMoves
+        else:
+            self.numMoves = self.frameStewart.numMoves(numRings, numRods)
+
+        # Layout, from the model bounds the renderer will draw
+        tableMin, tableMax = loadObjBounds(TABLE_MODEL)
+        self.tableHeight = round(float(tableMax[1]), 6)
+        # Spread the rods evenly along the table
+        self.rodPositions = np.array([(0.0, self.tableHeight, -1.0 + 2.0 * i / (numRods - 1))
+                                      for i in range(numRods)], dtype=np.float32)
+        ringHeights = {fileName: loadObjBounds(fileName)[1][1] for fileName in RING_MODELS}
+        self.ringHeights = np.array([round(float(ringHeights[getRingModel(i)] * getRingScale(i, numRings)), 6)
+                                     for i in range(numRings)], dtype=np.float32)
+        # Height the rings are lifted to when moving between rods, clear of the rods and of
+        # the tallest stack there can be
+        self.liftHeight = max(2.0, self.tableHeight + float(self.ringHeights.sum()) + LIFT_CLEARANCE)
+        # The rings are a contiguous range of entities in the transform store, from largest
+        # to smallest, which the renderer shares for the rest of the scene
+        self.transforms = transforms if transforms is not None else TransformStore()
+        self.ringSlice = self.transforms.addMany(numRings)
+        self.transforms.scales[self.ringSlice] = np.array([getRingScale(i, numRings) for i in range(numRings)])[:, None]
+
+        self.seek(0)
+        if playbackDuration:
+            self.setPlaybackDuration(playbackDuration)
+
+    @property
+    def ringPositions(self):
+        # View of the ring rows of the transform store, taken fresh as the store may grow
+        return self.transforms.positions[self.ringSlice]
+
+    def getSolution(self, state, first=0):
+        # Moves that take state, the state after move first, to the solved puzzle. Move files
+        # are played from move first up to their first illegal move, then with 3 rods the
+        # puzzle is finished optimally from whatever state the rods are in. The caller applies
+        # each move to state before pulling the next one
+        if self.moveFile:
+            yield from self.getFileMoves(state, first)
+            if first <= self.fileMoves:
+                self.fileEnd = state.copy()
+            if self.numRods == 3:
+                # Only now is it known how many moves finish the puzzle
+                self.numMoves = max(first, self.fileMoves) + distanceFrom(state.toConfiguration(), self.endRod)
+        elif self.numRods > 3:
+            yield from islice(solveFrameStewart(self.numRings, self.numRods, self.startRod, self.endRod,
+                                                self.frameStewart), first, None)
+            return
+        # Only 3 rods can be finished optimally from any state
+        if self.numRods == 3:
+            yield from solveFrom(state.toConfiguration(), self.endRod)
+
+    def getFileMoves(self, state, first, chunkSize=1 << 12):
+        # Moves of the move file from move first up to its first illegal move. Each chunk is
+        # checked from a copy of state before any of it is played, so a file is validated as
+        # it streams in rather than scanned up front
+        for lo in range(first, self.fileMoves, chunkSize):
+            codes = self.moveFile.getCodes(lo, min(chunkSize, self.fileMoves - lo))
+            illegal = validateCodes(codes, state.copy(), lo)
+            if illegal != -1:
+                codes = codes[:illegal - lo]
+            starts, ends = decodeMoves(codes)
+            yield from zip(starts.tolist(), ends.tolist())
+            if illegal != -1:
+                self.endFileMoves(illegal)
+                return
+
+    def endFileMoves(self, illegal):
+        # Playback reached an illegal move in the move file, its moves stop there
+        print("WARNING: move %s %s in '%s' breaks the rules, %s" %
+              (illegal, self.moveFile[illegal], self.moveFile.fileName,
+               "finishing optimally from there" if self.numRods == 3 else "playback stops there"))
+        self.fileMoves = illegal
+        self.numMoves = illegal
+        self.closedForm = False
+
+    def togglePlaying(self):
+        self.playing = not self.playing
+        # Start again if the animation has finished
+        if self.playing and self.moveIndex == self.numMoves:
+            self.seek(0)
+
+    def seek(self, moveIndex):
+        # Jump to the state after moveIndex moves. For the optimal 3 rod solution ring placement
+        # is rebuilt from the closed form configuration, so the cost doesn't depend on how far
+        # into the solution we are
+        moveIndex = max(0, min(moveIndex, self.numMoves))
+        if self.closedForm:
+            config = getConfiguration(self.numRings, moveIndex, self.startRod, self.endRod)
+            self.state = RodState.fromConfiguration(config)
+        elif self.moveFile:
+            moveIndex = self.replayMoveFile(moveIndex)
+        else:
+            # No closed form, replay the moves on the compact state instead
+            self.state = RodState.start(self.numRings, self.numRods, self.startRod)
+            validateMoves(islice(self.getSolution(self.state), moveIndex), self.state)
+        self.restartFrom(moveIndex)
+
+    def replayMoveFile(self, moveIndex):
+        # Sets the state after moveIndex moves of a move file that isn't the optimal solution,
+        # and returns moveIndex clamped to the moves there are. The file's moves are replayed
+        # in batches up to any illegal one. With 3 rods, the moves finishing the puzzle after
+        # them are placed in closed form from where the file's moves left the rings
+        if self.fileEnd is None or moveIndex < self.fileMoves:
+            self.state = RodState.start(self.numRings, self.numRods, self.startRod)
+            illegal = validateMoveFile(self.moveFile, self.state, min(moveIndex, self.fileMoves))
+            if illegal != -1:
+                self.endFileMoves(illegal)
+            if moveIndex < self.fileMoves:
+                return moveIndex
+            self.fileEnd = self.state.copy()
+        if self.numRods > 3:
+            self.state = self.fileEnd.copy()
+            return self.fileMoves
+        config = self.fileEnd.toConfiguration()
+        self.numMoves = self.fileMoves + distanceFrom(config, self.endRod)
+        moveIndex = min(moveIndex, self.numMoves)
+        self.state = RodState.fromConfiguration(getConfigurationFrom(config, moveIndex - self.fileMoves, self.endRod))
+        return moveIndex
+
+    def restartFrom(self, moveIndex):
+        # Places the rings from the state, which is after moveIndex moves, and restarts the
+        # solution and the move animation from there
+        self.placeRings()
+        self.moveIndex = moveIndex
+        self.moveTime = 0.0
+        self.accumulator = 0.0
+        self.solution = self.getSolution(self.state, moveIndex)
+        self.currentMove = self.getNextMove()
+
+    def placeRings(self):
+        # Sets every ring position from the compact state in one vectorised pass. Each ring
+        # sits on the rings larger than it on the same rod
+        rods = np.array(self.state.toConfiguration()[::-1]) - 1
+        onRod = rods[:, None] == np.arange(self.numRods)
+        stacked = np.cumsum(onRod * self.ringHeights[:, None], axis=0)
+        below = stacked[np.arange(self.numRings), rods] - self.ringHeights
+        positions = self.ringPositions
+        positions[:] = self.rodPositions[rods]
+        positions[:, 1] += below
+        # Running height of the stack on each rod, so lowering a ring doesn't need to add them up
+        self.rodHeights = stacked[-1].tolist() if self.numRings else [0.0] * self.numRods
+
+    def commitMoves(self, count):
+        # Applies count whole moves at once, starting with the current move, without animating
+        # them. For the optimal 3 rod solution this is a closed form seek, otherwise the moves
+        # are applied to the compact state and the rings placed from it afterwards
+        if self.currentMove is None or count <= 0:
+            return
+        if self.closedForm:
+            self.seek(self.moveIndex + count)
+            return
+        start, end = self.currentMove[:2]
+        self.state.move(start, end)
+        moved = 1
+        for start, end in islice(self.solution, count - 1):
+            self.state.move(start, end)
+            moved += 1
+        self.placeRings()
+        self.moveIndex += moved
+        self.moveTime = 0.0
+        self.accumulator = 0.0
+        self.currentMove = self.getNextMove()
+
+    def getRing(self, disk):
+        # Rings go from largest to smallest, while disks count from the smallest
+        return self.numRings - 1 - disk
+
+    def stepForward(self):
+        # Completes the current move
+        self.commitMoves(1)
+
+    def stepBack(self):
+        # Move file moves are undone by moving the ring back, otherwise the state is rebuilt
+        if self.moveFile and not self.closedForm and 0 < self.moveIndex <= self.fileMoves:
+            start, end = self.moveFile[self.moveIndex - 1]
+            self.state.move(end, start)
+            self.restartFrom(self.moveIndex - 1)
+        else:
+            self.seek(self.moveIndex - 1)
+
+    def scrub(self, position):
+        # Seek to a position on the timeline, from 0 (start) to 1 (solved)
+        self.seek(round(position * self.numMoves))
+
+    def getTimelinePosition(self):
+        if self.numMoves == 0:
+            return 1.0
+        return self.moveIndex / self.numMoves
+
+    def getNextMove(self):
+        # Pulls the next move from the solver and builds its lift, traverse and lower trajectory
+        nextMove = next(self.solution, None)
+        if nextMove is None:
+            # Reached the end of the solution
+            self.playing = False
+            return None
+        start, end = nextMove
+        ring = self.getRing(self.state.top(start))
+        endPos = self.rodPositions[end-1] + np.array((0, self.rodHeights[end-1], 0), dtype=np.float32)
+        return start, end, ring, Trajectory.liftMove(self.ringPositions[ring], endPos, self.liftHeight, self.ringSpeed)
+
+    def completeMove(self, start, end):
+        ring = self.getRing(self.state.move(start, end))
+        self.rodHeights[start-1] -= self.ringHeights[ring]
+        self.rodHeights[end-1] += self.ringHeights[ring]
+        self.moveIndex += 1
+
+    def estimateMoveDuration(self):
+        # Rough simulated time for one move: the lift and lower, plus the average distance between rods
+        rodPositions = self.rodPositions
+        distances = [np.linalg.norm(a - b) for i, a in enumerate(rodPositions) for b in rodPositions[i+1:]]
+        rise = self.liftHeight - rodPositions[0][1]
+        return (2 * rise + sum(distances) / len(distances)) / self.ringSpeed
+
+    def setPlaybackDuration(self, seconds):
+        # Picks the speed multiplier that plays the rest of the solution in about this many seconds
+        remaining = (self.numMoves - self.moveIndex) * self.estimateMoveDuration()
+        self.speed = min(max(remaining / seconds, self.minSpeed), self.maxSpeed)
+
+    def update(self, frameDt):
+        # Runs as many fixed simulation steps as the frame time and speed multiplier call for,
+        # then places the moving ring between the last two steps
+        if not self.playing:
+            return
+        if self.turbo and self.updateTurbo(frameDt):
+            return
+        self.accumulator += frameDt * self.speed
+        steps = int(self.accumulator / self.simStep)
+        if steps > self.maxStepsPerFrame:
+            steps = self.maxStepsPerFrame
+            self.accumulator = steps * self.simStep
+        for _ in range(steps):
+            self.stepSimulation(self.simStep)
+        self.accumulator -= steps * self.simStep
+        self.interpolateRing(self.accumulator / self.simStep)
+
+    def getTurboBatch(self, frameDt):
+        # Moves to commit in a frame frameDt seconds long
+        if self.turboDuration:
+            return max(1, ceil(self.numMoves * frameDt / self.turboDuration))
+        return self.turboMoves
+
+    def updateTurbo(self, frameDt):
+        # Commits this frame's batch of moves, starting with the move shown in flight last
+        # frame, and shows the next move part way along its trajectory. Returns False once
+        # the batch would reach the end of the solution, after committing all but the last
+        # move, which is then left to the normal fixed steps
+        remaining = self.numMoves - self.moveIndex
+        batch = self.getTurboBatch(frameDt)
+        if batch >= remaining:
+            self.commitMoves(remaining - 1)
+            return False
+        self.commitMoves(batch)
+        if self.currentMove is not None:
+            self.moveTime = self.turboMoveFraction * self.currentMove[3].duration
+            self.interpolateRing(1.0)
+        return True
+
+    def stepSimulation(self, dt):
+        # Advances the move timeline by dt of simulated time, completing moves as their
+        # trajectories finish and carrying left over time into the next move. Only the
+        # logical state is updated, the moving ring is placed by interpolateRing
+        if self.currentMove is None:
+            return
+
+        self.moveTime += dt
+        start, end, ring, trajectory = self.currentMove
+        while self.moveTime >= trajectory.duration:
+            self.ringPositions[ring] = trajectory.points[-1]
+            self.completeMove(start, end)
+            self.moveTime -= trajectory.duration
+            self.currentMove = self.getNextMove()
+            if self.currentMove is None:
+                self.moveTime = 0.0
+                return
+            start, end, ring, trajectory = self.currentMove
+
+    def interpolateRing(self, alpha):
+        # Trajectories are evaluated in closed form, so blending the previous and current
+        # step is the same as evaluating alpha of a step behind the simulation
+        if self.currentMove is None:
+            return
+        start, end, ring, trajectory = self.currentMove
+        self.ringPositions[ring] = trajectory.evaluate(max(0.0, self.moveTime - (1 - alpha) * self.simStep))
@@ -0,0 +1,206 @@
+import numpy as np
+
+
+def rodLabels(n, start, end, other=None):
+    # Rods are labelled 1, 2, 3. The canonical iterative solution moves the tower
+    # from rod 0 to rod 2 when n is odd, and to rod 1 when n is even, so map the
+    # canonical rods onto the requested start and end rods.
+    # Other is only needed when solving on 3 rods out of more
+    if other is None:
+        other = 6 - (start + end)
+    if n % 2:
+        return (start, other, end)
+    return (start, end, other)
+
+
+def solveHanoi(n, start=1, end=3, first=0, other=None):
+    # Iterative solver that yields the (start, end) rods of each move on demand,
+    # so memory use is O(n) no matter how long the solution is. Starts at move first,
+    # so a solution can be resumed part way through.
+    # Based on the binary structure of the solution: move m (counting from 1) moves
+    # the disk given by the number of trailing zeros of m, from canonical rod
+    # (m & (m - 1)) % 3 to canonical rod ((m | (m - 1)) + 1) % 3
+    labels = rodLabels(n, start, end, other)
+    for m in range(first + 1, 1 << n):
+        yield labels[(m & (m - 1)) % 3], labels[((m | (m - 1)) + 1) % 3]
+
+
+def getMove(n, k, start=1, end=3):
+    # Returns the (start, end) rods of move k (counting from 0) of the optimal solution,
+    # straight from the bit pattern of k without generating the earlier moves
+    if not 0 <= k < (1 << n) - 1:
+        raise IndexError("move %s out of range for %s rings" % (k, n))
+    labels = rodLabels(n, start, end)
+    m = k + 1
+    return labels[(m & (m - 1)) % 3], labels[((m | (m - 1)) + 1) % 3]
+
+
+def getConfiguration(n, k, start=1, end=3):
+    # Returns the rod each disk is on after the first k moves, indexed by disk with
+    # disk 0 the smallest. O(n): walk from the largest disk down, each disk is on the
+    # start rod of its sub-problem until move 2^disk, and on the end rod after it
+    if not 0 <= k < (1 << n):
+        raise IndexError("move %s out of range for %s rings" % (k, n))
+    other = 6 - (start + end)
+    config = [0] * n
+    for disk in range(n - 1, -1, -1):
+        half = 1 << disk
+        if k < half:
+            # Still moving the disks above onto the other rod
+            config[disk] = start
+            end, other = other, end
+        else:
+            # Disk has moved, now moving the disks above from the other rod onto it
+            config[disk] = end
+            k -= half
+            start, other = other, start
+    return config
+
+
+def solveFrom(config, end=3):
+    # Optimal moves from any legal configuration (the rod each disk is on, smallest disk
+    # first) to all rings on the end rod, using the largest disk decision: the largest
+    # disk not on its target has to move there, so the disks above it first go to the
+    # third rod, which becomes the target for the next smaller disk. Once a disk has
+    # moved, the disks above it follow as a standard tower
+    steps = []
+    target = end
+    for disk in range(len(config) - 1, -1, -1):
+        if config[disk] != target:
+            other = 6 - (config[disk] + target)
+            steps.append((disk, config[disk], target, other))
+            target = other
+    for disk, start, target, other in reversed(steps):
+        yield start, target
+        yield from solveHanoi(disk, other, target)
+
+
+def getConfigurationFrom(config, k, end=3):
+    # Returns the configuration after the first k moves of solveFrom(config, end), in O(n).
+    # Each of solveFrom's steps moves one disk and then the tower above it, which is stacked
+    # on the third rod, so whole steps are applied directly and the step move k falls in is
+    # placed with getConfiguration
+    config = list(config)
+    steps = []
+    target = end
+    for disk in range(len(config) - 1, -1, -1):
+        if config[disk] != target:
+            other = 6 - (config[disk] + target)
+            steps.append((disk, target, other))
+            target = other
+    for disk, target, other in reversed(steps):
+        if k == 0:
+            break
+        config[disk] = target
+        k -= 1
+        tower = (1 << disk) - 1
+        if k >= tower:
+            config[:disk] = [target] * disk
+            k -= tower
+        else:
+            config[:disk] = getConfiguration(disk, k, other, target)
+            k = 0
+    if k:
+        raise IndexError("move past the end of the solution")
+    return config
+
+
+def distanceFrom(config, end=3):
+    # Number of moves solveFrom takes, in O(n). Moving disk d and then the tower
+    # above it takes 1 + 2^d - 1 moves
+    distance = 0
+    target = end
+    for disk in range(len(config) - 1, -1, -1):
+        if config[disk] != target:
+            distance += 1 << disk
+            target = 6 - (config[disk] + target)
+    return distance
+
+
+class DistanceTable:
+    # Precomputed distanceFrom for every configuration of up to MAX_RINGS rings, for O(1)
+    # lookups. Configurations are indexed by their base 3 code, see encode.
+    # Built a disk at a time: adding disk k on rod p either leaves the distance to
+    # rod t alone (p == t), or adds 2^k to the distance to the third rod
+    MAX_RINGS = 12
+
+    def __init__(self, n):
+        if n > self.MAX_RINGS:
+            raise ValueError("distance tables are limited to %s rings" % self.MAX_RINGS)
+        self.numRings = n
+        # distances[t][code] is the distance to rod t + 1
+        distances = np.zeros((3, 1), dtype=np.uint32)
+        for disk in range(n):
+            blocks = [[distances[t] if p == t else distances[3 - (p + t)] + (1 << disk) for p in range(3)]
+                      for t in range(3)]
+            distances = np.array([np.concatenate(b) for b in blocks])
+        self.distances = distances
+
+    def encode(self, config):
+        code = 0
+        for rod in reversed(config):
+            code = code * 3 + rod - 1
+        return code
+
+    def distance(self, code, end=3):
+        return int(self.distances[end - 1][code])
+
+
+# Moves are packed into 4 bits as (start << 2) | end, with rods counted from 0,
+# so a whole solution fits in a uint8 array at 1 byte per move. Only rods 1 to 4 fit
+def encodeMove(start, end):
+    if not (1 <= start <= 4 and 1 <= end <= 4):
+        raise ValueError("move from rod %s to rod %s can't be encoded, rods must be 1 to 4" % (start, end))
+    return ((start - 1) << 2) | (end - 1)
+
+
+def decodeMove(code):
+    return (code >> 2) + 1, (code & 3) + 1
+
+
+def decodeMoves(codes):
+    # Vectorised decodeMove, returns arrays of start and end rods
+    codes = np.asarray(codes, dtype=np.uint8)
+    return (codes >> 2) + 1, (codes & 3) + 1
+
+
+def solveHanoiArray(n, start=1, end=3, out=None, first=0, count=None, chunkSize=1 << 14):
+    # Batch version of solveHanoi, fills a uint8 array with the encoded moves first to
+    # first + count using vectorised bit operations over the move indices instead of
+    # recursion. out can be a preallocated array or memmap, otherwise one is allocated
+    total = (1 << n) - 1
+    if count is None:
+        count = total - first
+    if first < 0 or count < 0 or first + count > total:
+        raise IndexError("moves %s to %s out of range for %s rings" % (first, first + count, n))
+    if out is None:
+        out = np.empty(count, dtype=np.uint8)
+    elif len(out) < count:
+        raise ValueError("output array holds %s moves, %s needed" % (len(out), count))
+
+    # Lookup table from canonical move codes to the requested rods
+    labels = rodLabels(n, start, end)
+    lut = np.zeros(16, dtype=np.uint8)
+    for a in range(3):
+        for b in range(3):
+            lut[(a << 2) | b] = encodeMove(labels[a], labels[b])
+
+    # (m | (m - 1)) + 1 needs one bit more than m, so uint32 is enough up to 31 rings.
+    # Small chunks keep the temporaries in cache, which is faster than whole array passes
+    indexType = np.uint32 if n <= 31 else np.uint64
+    for lo in range(0, count, chunkSize):
+        hi = min(lo + chunkSize, count)
+        m = np.arange(first + lo + 1, first + hi + 1, dtype=indexType)
+        mm = m - 1
+        codes = ((m & mm) % 3) << 2
+        codes |= ((m | mm) + 1) % 3
+        out[lo:hi] = lut[codes]
+    return out
+
+
+def saveHanoiArray(fileName, n, start=1, end=3):
+    # Writes the full solution to a memory mapped .npy file, so it never has to fit in RAM
+    out = np.lib.format.open_memmap(fileName, mode="w+", dtype=np.uint8, shape=((1 << n) - 1,))
+    solveHanoiArray(n, start, end, out)
+    out.flush()
+    return out
@@ -0,0 +1,102 @@
+from ctypes import c_float, c_void_p, sizeof
+from OpenGL.GL import *
+import numpy as np
+from Mesh import Mesh
+from RenderQueue import DrawItem, RenderQueue
+from TransformStore import TransformStore
+
+
+class InstancedModel:
+    # Draws every copy of a mesh with a single instanced draw per chunk. The copies are
+    # entities in a transform store, each frame their model and normal matrices
+    # are gathered from it into one per-instance buffer, so the number of draw calls doesn't
+    # depend on how many copies there are. Needs a shader reading the instance attributes,
+    # like shaders/lightInstancedVert.glsl
+
+    # Per-instance attributes, after the mesh attributes. A mat4 takes 4 locations and a mat3 takes 3
+    AA_InstanceModel = 5
+    AA_InstanceNormalMat = 9
+    # Floats per instance, the model matrix then the normal matrix, both column major
+    InstanceFloats = 16 + 9
+
+    def __init__(self, mesh: Mesh, shader, transforms: TransformStore, indices):
+        self.mesh = mesh
+        self.shader = shader
+        self.shader.use()
+        Mesh.setDefaultUniformBindings(self.shader.program)
+        self.transforms = transforms
+        self.indices = np.asarray(indices, dtype=np.intp)
+        self.instanceData = np.zeros((len(self.indices), self.InstanceFloats), dtype=np.float32)
+        # Instances drawn, the first ones in instanceData
+        self.visibleCount = len(self.indices)
+        # The instances and their transform revisions last uploaded
+        self.uploadedIndices = None
+        self.uploadedRevisions = None
+
+        # A VAO of our own, reading the mesh's vertex and index buffers plus the instance buffer
+        self.vertexArrayObject = glGenVertexArrays(1)
+        glBindVertexArray(self.vertexArrayObject)
+        mesh.bindVertexAttributes()
+
+        self.instanceBuffer = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.instanceBuffer)
+        glBufferData(GL_ARRAY_BUFFER, self.instanceData, GL_DYNAMIC_DRAW)
+        stride = self.InstanceFloats * sizeof(c_float)
+        columns = [(self.AA_InstanceModel + i, 4, 4 * i) for i in range(4)]
+        columns += [(self.AA_InstanceNormalMat + i, 3, 16 + 3 * i) for i in range(3)]
+        for attribLoc, size, offset in columns:
+            glVertexAttribPointer(attribLoc, size, GL_FLOAT, GL_FALSE, stride, c_void_p(offset * sizeof(c_float)))
+            glEnableVertexAttribArray(attribLoc)
+            glVertexAttribDivisor(attribLoc, 1)
+
+        glBindVertexArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+
+    def release(self):
+        # Deletes our own buffers and lets go of the mesh, acquired by the caller
+        glDeleteVertexArrays(1, [self.vertexArrayObject])
+        glDeleteBuffers(1, [self.instanceBuffer])
+        self.mesh.release()
+
+    def updateInstances(self, visible=None):
+        # Gathers the instance matrices from the transform store, which must have had its
+        # matrices updated this frame, and uploads them in one go. Given a mask of the
+        # instances in view, only those are uploaded and drawn
+        indices = self.indices if visible is None else self.indices[visible]
+        self.visibleCount = len(indices)
+        if self.visibleCount == 0:
+            return
+        # Nothing to upload if the same instances are drawn and none of them has moved
+        revisions = self.transforms.revisions[indices]
+        if np.array_equal(indices, self.uploadedIndices) and np.array_equal(revisions, self.uploadedRevisions):
+            return
+        self.uploadedIndices = indices
+        self.uploadedRevisions = revisions
+        instanceData = self.instanceData[:self.visibleCount]
+        # Column major model and normal matrices, as the attributes' columns come one location at a time
+        instanceData[:, :16] = self.transforms.matrices[indices].transpose(0, 2, 1).reshape(-1, 16)
+        instanceData[:, 16:] = self.transforms.normalMatrices[indices].transpose(0, 2, 1).reshape(-1, 9)
+        glBindBuffer(GL_ARRAY_BUFFER, self.instanceBuffer)
+        glBufferSubData(GL_ARRAY_BUFFER, 0, instanceData.nbytes, instanceData)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def render(self):
+        # Draws just these instances, scenes should queue everything and flush once
+        queue = RenderQueue()
+        self.queue(queue)
+        queue.flush()
+
+    def queue(self, renderQueue, culler=None):
+        # Uploads the instance matrices and adds an instanced draw per chunk to the render queue,
+        # of just the instances in view if given a FrustumCuller
+        self.updateInstances(culler.cullInstances(self) if culler is not None else None)
+        if self.visibleCount == 0:
+            return
+        for material, chunkOffset, chunkCount, renderFlags in self.mesh.chunks:
+            textures, materialRange = self.mesh.getMaterialBindings(material)
+            renderQueue.submit(DrawItem(self.shader, self.vertexArrayObject,
+                                        lambda pointer=self.mesh.indexPointer(chunkOffset), count=chunkCount:
+                                            glDrawElementsInstanced(GL_TRIANGLES, count, self.mesh.indexType, pointer,
+                                                                    self.visibleCount),
+                                        textures, materialRange))
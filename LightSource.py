@@ -1,10 +1,21 @@
 from ctypes import c_float
+import numpy as np
 from OpenGL.GL import *
 import lab_utils as lu
 from Shader import Shader
+from RenderQueue import DrawItem
 
 
 class LightSource:
+    # A point light's position and colour, its cube is drawn by a LightSourceGroup
+    def __init__(self, pos: lu.vec3, colour: lu.vec3 = lu.vec3(1.0, 1.0, 1.0)):
+        self.position = lu.vec3(*pos)
+        self.colour = colour
+
+
+class LightSourceGroup:
+    # Draws the cubes of many light sources with one instanced draw, reading each light's
+    # position and colour from a per-instance buffer
 
     # Positions and texture coords. Texture not needed
     cubeVerts = [
@@ -51,32 +62,41 @@ class LightSource:
         -0.5,  0.5, -0.5,  # 0.0, 1.0
     ]
 
-    def __init__(self, pos: lu.vec3, shader: Shader = None, colour: lu.vec3 = lu.vec3(1.0, 1.0, 1.0)):
-        self.position = lu.vec3(*pos)
-        if shader:
-            self.shader = shader
-        else:
-            self.shader = Shader(vertFile='shaders/lightSourceVert.glsl', fragFile='shaders/lightSourceFrag.glsl')
-        self.colour = colour
+    def __init__(self, lights, scale=0.2):
+        self.lights = lights
+        self.shader = Shader(vertFile='shaders/lightsourceInstancedVert.glsl',
+                             fragFile='shaders/lightsourceInstancedFrag.glsl')
         self.__vao = glGenVertexArrays(1)
-        vbo = glGenBuffers(1)
         glBindVertexArray(self.__vao)
+        vbo = glGenBuffers(1)
         glBindBuffer(GL_ARRAY_BUFFER, vbo)
         cube_buffer = (c_float * len(self.cubeVerts))(*self.cubeVerts)
         glBufferData(GL_ARRAY_BUFFER, len(self.cubeVerts) * ctypes.sizeof(GLfloat), cube_buffer, GL_STATIC_DRAW)
-
         glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, 3 * ctypes.sizeof(GLfloat), None)
         glEnableVertexAttribArray(0)
 
-        self.shader.use()
-        self.shader.setUniform("objectColour", lu.vec3(1.0, 0.5, 0.3))
-        self.shader.setUniform("lightColour", colour)
+        # Position then colour for each light
+        self.instanceBuffer = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.instanceBuffer)
+        stride = 6 * ctypes.sizeof(GLfloat)
+        glVertexAttribPointer(1, 3, GL_FLOAT, GL_FALSE, stride, None)
+        glVertexAttribPointer(2, 3, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(3 * ctypes.sizeof(GLfloat)))
+        for attribLoc in (1, 2):
+            glEnableVertexAttribArray(attribLoc)
+            glVertexAttribDivisor(attribLoc, 1)
+        self.updateInstances()
+        glBindVertexArray(0)
 
-    def draw(self, projection, view):
-        self.shader.use()
-        self.shader.setUniform("projection", projection)
-        self.shader.setUniform("view", view)
-        model = lu.make_translation(*self.position) * lu.make_scale(0.2)
-        self.shader.setUniform("model", model)
-        glBindVertexArray(self.__vao)
-        glDrawArrays(GL_TRIANGLES, 0, 36)
+        self.shader.setUniform("scale", scale)
+
+    def updateInstances(self):
+        # Call again if the lights move or change colour
+        data = np.array([[*light.position, *light.colour] for light in self.lights], dtype=np.float32)
+        glBindBuffer(GL_ARRAY_BUFFER, self.instanceBuffer)
+        glBufferData(GL_ARRAY_BUFFER, data, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def queue(self, renderQueue):
+        if self.lights:
+            renderQueue.submit(DrawItem(self.shader, self.__vao,
+                                        lambda: glDrawArraysInstanced(GL_TRIANGLES, 0, 36, len(self.lights))))
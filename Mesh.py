@@ -0,0 +1,380 @@
+from TextureManager import textureManager
+from Shader import UNIFORM_BLOCK_BINDINGS
+from OpenGL.GL import *
+import os
+from ctypes import sizeof, c_float, c_void_p
+from lab_utils import getUniformLocationDebug
+import numpy as np
+from VertexCache import optimizeVertexCache, reorderVertices
+
+
+class Mesh:
+    # Immutable GPU resources loaded from an OBJ file: the VAO and its buffers, the chunks
+    # with their materials, and the bounds. Meshes are shared, acquire returns the cached
+    # mesh for a file if it is already loaded. Each acquire must be matched by a release,
+    # and meshes nothing uses any more are only deleted by evictUnused
+    RF_Transparent = 1
+    RF_AlphaTested = 2
+    RF_Opaque = 4
+    RF_All = RF_Opaque | RF_AlphaTested | RF_Transparent
+
+    AA_Position = 0
+    AA_Normal = 1
+    AA_TexCoord = 2
+    AA_Tangent = 3
+    AA_Bitangent = 4
+    # Floats per vertex in the interleaved vertex buffer: position, normal and uv
+    VertexFloats = 3 + 3 + 2
+
+    TU_Diffuse = 0
+    TU_Opacity = 1
+    TU_Specular = 2
+    TU_Normal = 3
+    TU_Max = 4
+
+    UBS_MaterialProperties = UNIFORM_BLOCK_BINDINGS["MaterialProperties"]
+    # Size of the std140 MaterialProperties block: diffuse colour and alpha, specular colour
+    # and exponent, then the emissive colour padded to 16 bytes
+    MaterialPropertiesSize = 12 * sizeof(c_float)
+
+    # Loaded meshes by absolute file name
+    cache = {}
+
+    @classmethod
+    def acquire(cls, fileName):
+        key = os.path.abspath(fileName)
+        mesh = cls.cache.get(key)
+        if mesh is None:
+            mesh = cls(fileName)
+            cls.cache[key] = mesh
+        mesh.refCount += 1
+        return mesh
+
+    def release(self):
+        assert self.refCount > 0
+        self.refCount -= 1
+
+    @classmethod
+    def evictUnused(cls):
+        # Deletes the meshes no longer acquired by anything, returns how many were deleted
+        unused = [key for key, mesh in cls.cache.items() if mesh.refCount == 0]
+        for key in unused:
+            cls.cache.pop(key).delete()
+        return len(unused)
+
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.refCount = 0
+        # Default textures are shared by every mesh
+        self.defaultTextureOne = textureManager.getDefaultTexture()
+        self.defaultNormalTexture = textureManager.getDefaultNormalTexture()
+        self.load(fileName)
+
+    def delete(self):
+        for material in self.materials.values():
+            for texture in material["texture"].values():
+                if texture != -1:
+                    textureManager.release(texture)
+        glDeleteVertexArrays(1, [self.vertexArrayObject])
+        glDeleteBuffers(3, [self.vertexBuffer, self.indexBuffer, self.materialBuffer])
+
+    def load(self, fileName):
+        basePath, _ = os.path.split(fileName)
+        with open(fileName, "r") as inFile:
+            self.loadObj(inFile.readlines(), basePath)
+
+    def loadObj(self, objLines, basePath):
+        positions = []
+        normals = []
+        uvs = []
+        materialChunks = []
+        materials = {}
+
+        for l in objLines:
+            # 1 standardize line
+            if len(l) > 0 and l[:1] != "#":
+                tokens = l.split()
+                if len(tokens):
+                    if tokens[0] == "mtllib":
+                        assert len(tokens) >= 2
+                        materialName = " ".join(tokens[1:])
+                        materials = self.loadMaterials(os.path.join(basePath, materialName), basePath)
+                    if tokens[0] == "usemtl":
+                        assert len(tokens) >= 2
+                        materialName = " ".join(tokens[1:])
+                        if len(materialChunks) == 0 or materialChunks[-1][0] != materialName:
+                            materialChunks.append([materialName, []])
+                    elif tokens[0] == "v":
+                        assert len(tokens[1:]) >= 3
+                        positions.append([float(v) for v in tokens[1:4]])
+                    elif tokens[0] == "vn":
+                        assert len(tokens[1:]) >= 3
+                        normals.append([float(v) for v in tokens[1:4]])
+                    elif tokens[0] == "vt":
+                        assert len(tokens[1:]) >= 2
+                        uvs.append([float(v) for v in tokens[1:3]])
+                    elif tokens[0] == "f":
+                        materialChunks[-1][1] += self.parseFace(tokens[1:])
+        # One vertex per distinct (position, uv, normal) triple the faces use, instead of one per corner
+        vertexIndices = {}
+        vertexKeys = []
+        indices = []
+        self.chunks = []
+        self.materials = materials
+        for matId, tris in materialChunks:
+            material = materials[matId]
+            renderFlags = 0
+            if material["alpha"] != 1.0:
+                renderFlags |= self.RF_Transparent
+            elif material["texture"]["opacity"] != -1:
+                renderFlags |= self.RF_AlphaTested
+            else:
+                renderFlags |= self.RF_Opaque
+
+            chunkIndices = []
+            for corner in tris:
+                key = tuple(corner)
+                index = vertexIndices.get(key)
+                if index is None:
+                    index = vertexIndices[key] = len(vertexKeys)
+                    vertexKeys.append(key)
+                chunkIndices.append(index)
+            chunkIndices = optimizeVertexCache(chunkIndices, len(vertexKeys))
+
+            # chunkOffset and chunkCount are in indices
+            chunkOffset = sum(len(ci) for ci in indices)
+            self.chunks.append((material, chunkOffset, len(chunkIndices), renderFlags))
+            indices.append(chunkIndices)
+
+        indices = np.concatenate(indices) if indices else np.zeros(0, dtype=np.uint32)
+        indices, order = reorderVertices(indices, len(vertexKeys))
+        self.numVerts = len(vertexKeys)
+        self.numIndices = len(indices)
+
+        # Interleaved 3 pos, 3 norm, 2 tex
+        keys = np.array(vertexKeys, dtype=np.intp).reshape(-1, 3)[order]
+        vertices = np.zeros((self.numVerts, self.VertexFloats), dtype=np.float32)
+        vertices[:, 0:3] = np.array(positions, dtype=np.float32)[keys[:, 0]]
+        vertices[:, 3:6] = np.array(normals, dtype=np.float32)[keys[:, 2]]
+        hasUv = keys[:, 1] != -1
+        if hasUv.any():
+            vertices[hasUv, 6:8] = np.array(uvs, dtype=np.float32)[keys[hasUv, 1]]
+
+        # 16 bit indices when they fit, halving the index buffer
+        if self.numVerts <= 1 << 16:
+            self.indexType, indexDtype = GL_UNSIGNED_SHORT, np.uint16
+        else:
+            self.indexType, indexDtype = GL_UNSIGNED_INT, np.uint32
+        indices = indices.astype(indexDtype)
+        self.indexSize = indices.itemsize
+
+        self.vertexBuffer = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vertexBuffer)
+        glBufferData(GL_ARRAY_BUFFER, vertices, GL_STATIC_DRAW)
+        self.indexBuffer = glGenBuffers(1)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.indexBuffer)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices, GL_STATIC_DRAW)
+
+        self.vertexArrayObject = glGenVertexArrays(1)
+        glBindVertexArray(self.vertexArrayObject)
+        self.bindVertexAttributes()
+
+        npPos = np.array(positions)
+        self.aabbMin = npPos.min(0)
+        self.aabbMax = npPos.max(0)
+        self.centre = (self.aabbMin + self.aabbMax) * 0.5
+
+        glBindVertexArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+
+        # Every material goes in one uniform buffer, at the slot given by its offset
+        for offset, material in enumerate(materials.values()):
+            material["offset"] = offset
+        # Ranges bound from the buffer must start on the implementation's alignment
+        alignment = glGetIntegerv(GL_UNIFORM_BUFFER_OFFSET_ALIGNMENT)
+        self.materialStride = -(-self.MaterialPropertiesSize // alignment) * alignment
+        self.materialBuffer = glGenBuffers(1)
+        self.updateMaterialBuffer()
+
+    def bindVertexAttributes(self):
+        # Points the bound VAO at the interleaved vertex buffer and the index buffer, used by
+        # the mesh's own VAO and by others drawing the mesh, like InstancedModel
+        stride = self.VertexFloats * sizeof(c_float)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vertexBuffer)
+        for attribLoc, size, offset in [(self.AA_Position, 3, 0), (self.AA_Normal, 3, 3), (self.AA_TexCoord, 2, 6)]:
+            glVertexAttribPointer(attribLoc, size, GL_FLOAT, GL_FALSE, stride, c_void_p(offset * sizeof(c_float)))
+            glEnableVertexAttribArray(attribLoc)
+        # The tangent frame isn't computed (TODO), so rather than buffers of the same vector for
+        # every vertex the arrays are left disabled and the attributes read a constant value
+        glDisableVertexAttribArray(self.AA_Tangent)
+        glVertexAttrib3f(self.AA_Tangent, 0.0, 1.0, 0.0)
+        glDisableVertexAttribArray(self.AA_Bitangent)
+        glVertexAttrib3f(self.AA_Bitangent, 1.0, 0.0, 0.0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.indexBuffer)
+
+    def indexPointer(self, chunkOffset):
+        # Byte offset into the index buffer of a chunk's first index, for glDrawElements
+        return c_void_p(chunkOffset * self.indexSize)
+
+    def updateMaterialBuffer(self):
+        # Packs every material into the std140 layout of the MaterialProperties block and uploads them
+        data = np.zeros((max(len(self.materials), 1), self.materialStride // sizeof(c_float)), dtype=np.float32)
+        for material in self.materials.values():
+            row = data[material["offset"]]
+            row[0:3] = material["color"]["diffuse"]
+            row[3] = material["alpha"]
+            row[4:7] = material["color"]["specular"]
+            row[7] = material["specularExponent"]
+            row[8:11] = material["color"]["emissive"]
+        glBindBuffer(GL_UNIFORM_BUFFER, self.materialBuffer)
+        glBufferData(GL_UNIFORM_BUFFER, data, GL_STATIC_DRAW)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+
+    def parseFloats(self, tokens, minNum):
+        assert len(tokens) >= minNum
+        return [float(v) for v in tokens[0:minNum]]
+
+    def parseFaceIndexSet(self, s):
+        inds = s.split('/')
+        assert len(inds) == 3
+        return [int(ind) - 1 if ind != '' else -1 for ind in inds]
+
+    def parseFace(self, tokens):
+        assert len(tokens) >= 3
+        result = []
+        v0 = self.parseFaceIndexSet(tokens[0])
+        v1 = self.parseFaceIndexSet(tokens[1])
+        for t in tokens[2:]:
+            v2 = self.parseFaceIndexSet(t)
+            result += [v0, v1, v2]
+            v1 = v2
+        return result
+
+    def loadMaterials(self, materialFileName, basePath):
+        materials = {}
+        with open(materialFileName, "r") as inFile:
+            currentMaterial = ""
+            for l in inFile.readlines():
+                tokens = l.split()
+                if len(tokens):
+                    if tokens[0] == "newmtl":
+                        assert len(tokens) >= 2
+                        currentMaterial = " ".join(tokens[1:])
+                        materials[currentMaterial] = {
+                            "color": {
+                                "diffuse": [0.5, 0.5, 0.5],
+                                "ambient": [0.5, 0.5, 0.5],
+                                "specular": [0.5, 0.5, 0.5],
+                                "emissive": [0.0, 0.0, 0.0]
+                            },
+                            "texture": {
+                                "diffuse": -1,
+                                "opacity": -1,
+                                "specular": -1,
+                                "normal": -1,
+                            },
+                            "alpha": 1.0,
+                            "specularExponent": 22.0,
+                            "offset": 0,
+                        }
+                    elif tokens[0] == "Ka":
+                        materials[currentMaterial]["color"]["ambient"] = self.parseFloats(tokens[1:], 3)
+                    elif tokens[0] == "Ns":
+                        materials[currentMaterial]["specularExponent"] = float(tokens[1])
+                    # elif tokens[0] == "Ni":
+                    #     #Optical density - NOT USED ATM
+                    #     materials[currentMaterial]["specularExponent"] = float(tokens[1])
+                    elif tokens[0] == "Kd":
+                        materials[currentMaterial]["color"]["diffuse"] = self.parseFloats(tokens[1:], 3)
+                    elif tokens[0] == "Ks":
+                        materials[currentMaterial]["color"]["specular"] = self.parseFloats(tokens[1:], 3)
+                    elif tokens[0] == "Ke":
+                        materials[currentMaterial]["color"]["emissive"] = self.parseFloats(tokens[1:], 3)
+                    elif tokens[0] == "map_Kd":
+                        materials[currentMaterial]["texture"]["diffuse"] = self.loadTexture(
+                            " ".join(tokens[1:]), basePath, True)
+                    elif tokens[0] == "map_Ks":
+                        materials[currentMaterial]["texture"]["specular"] = self.loadTexture(
+                            " ".join(tokens[1:]), basePath, True)
+                    elif tokens[0] == "map_bump" or tokens[0] == "bump":
+                        materials[currentMaterial]["texture"]["normal"] = self.loadTexture(
+                            " ".join(tokens[1:]), basePath, False)
+                    elif tokens[0] == "map_d":
+                        materials[currentMaterial]["texture"]["opacity"] = self.loadTexture(
+                            " ".join(tokens[1:]), basePath, False)
+                    elif tokens[0] == "d":
+                        materials[currentMaterial]["alpha"] = float(tokens[1])
+
+        # check of there is a colour texture but the coour is zero and then change it to 1, Maya exporter does this to us...
+        for id, m in materials.items():
+            for ch in ["diffuse", "specular"]:
+                if m["texture"][ch] != -1 and sum(m["color"][ch]) == 0.0:
+                    m["color"][ch] = [1, 1, 1]
+                if m["texture"][ch] != -1 and sum(m["color"][ch]) == 0.0:
+                    m["color"][ch] = [1, 1, 1]
+        return materials
+
+    def loadTexture(self, fileName, basePath, srgb):
+        fullFileName = os.path.join(basePath, fileName)
+        try:
+            return textureManager.acquire(fullFileName, srgb)
+        except Exception as e:
+            print("WARNING: FAILED to load texture '%s'" % fileName)
+            print(e)
+
+        return -1
+
+    def updateMaterials(self):
+        newChunks = []
+        for material, chunkOffset, chunkCount, renderFlags in self.chunks:
+            renderFlags = 0
+            if material["alpha"] != 1.0:
+                renderFlags |= self.RF_Transparent
+            elif material["texture"]["opacity"] != -1:
+                renderFlags |= self.RF_AlphaTested
+            else:
+                renderFlags |= self.RF_Opaque
+            newChunks.append((material, chunkOffset, chunkCount, renderFlags))
+        self.chunks = newChunks
+        self.updateMaterialBuffer()
+
+    def getMaterialBindings(self, material, overrideDiffuseTextureWithDefault=False):
+        # The material's textures as (unit, target, id), falling back to the defaults for missing
+        # maps, and its range of the material uniform buffer as (binding, buffer, offset, size)
+        def textureId(texture, defaultTexture):
+            return texture.id if texture != -1 else defaultTexture.id
+        diffuse = -1 if overrideDiffuseTextureWithDefault else material["texture"]["diffuse"]
+        textures = ((self.TU_Diffuse, GL_TEXTURE_2D, textureId(diffuse, self.defaultTextureOne)),
+                    (self.TU_Opacity, GL_TEXTURE_2D, textureId(material["texture"]["opacity"], self.defaultTextureOne)),
+                    (self.TU_Specular, GL_TEXTURE_2D, textureId(material["texture"]["specular"], self.defaultTextureOne)),
+                    (self.TU_Normal, GL_TEXTURE_2D, textureId(material["texture"]["normal"], self.defaultNormalTexture)))
+        materialRange = (self.UBS_MaterialProperties, self.materialBuffer,
+                         material["offset"] * self.materialStride, self.MaterialPropertiesSize)
+        return textures, materialRange
+
+    # useful to get the default bindings that the Mesh will use when rendering, use to set up own shaders
+    # for example an optimized shadow shader perhaps?
+    @staticmethod
+    def getDefaultAttributeBindings():
+        return {
+            "position": Mesh.AA_Position,
+            "normal": Mesh.AA_Normal,
+            "texCoord": Mesh.AA_TexCoord,
+            "tangent": Mesh.AA_Tangent,
+            "bitangent": Mesh.AA_Bitangent,
+        }
+
+        #
+        # Helper to set the default uniforms provided by Mesh. This only needs to be done once after creating the shader
+        # NOTE: the shader must be bound when calling this function.
+
+    @staticmethod
+    def setDefaultUniformBindings(shaderProgram):
+        assert glGetIntegerv(GL_CURRENT_PROGRAM) == shaderProgram
+
+        glUniform1i(getUniformLocationDebug(shaderProgram, "diffuse_texture"), Mesh.TU_Diffuse)
+        glUniform1i(getUniformLocationDebug(shaderProgram, "opacity_texture"), Mesh.TU_Opacity)
+        glUniform1i(getUniformLocationDebug(shaderProgram, "specular_texture"), Mesh.TU_Specular)
+        glUniform1i(getUniformLocationDebug(shaderProgram, "normal_texture"), Mesh.TU_Normal)
+        # The MaterialProperties block is bound to UBS_MaterialProperties by Shader when it is linked
@@ -0,0 +1,213 @@
+import mmap
+import struct
+import zlib
+import numpy as np
+from HanoiSolver import decodeMoves, encodeMove, solveHanoiArray
+
+# Binary move file format, little endian:
+#   header: magic, version, ring count, rod count, start rod, end rod, flags, padding, move count, CRC32 of the moves
+#   moves: packed 2 per byte as the 4 bit codes from HanoiSolver.encodeMove, even moves in the low nibble
+# Version 1 files have no flags, the byte was padding and is always 0
+MAGIC = b"HNOI"
+VERSION = 2
+HEADER = struct.Struct("<4sBBBBBB2xQI")
+# The moves are the optimal 3 rod solution, set by the writer so readers don't have to check
+FLAG_OPTIMAL = 1
+
+
+def packMoves(codes):
+    # Pack an even number of move codes into bytes, 2 per byte
+    codes = np.asarray(codes, dtype=np.uint8)
+    return (codes[0::2] | (codes[1::2] << 4)).tobytes()
+
+
+def unpackMoves(data):
+    # Unpack bytes into move codes, 2 per byte
+    packed = np.frombuffer(data, dtype=np.uint8)
+    codes = np.empty(2 * len(packed), dtype=np.uint8)
+    codes[0::2] = packed & 15
+    codes[1::2] = packed >> 4
+    return codes
+
+
+class MoveFileWriter:
+    # Streaming writer, moves are packed and checksummed as they arrive so a whole
+    # solution never has to be held in memory. The header is written on close,
+    # once the move count and CRC are known. Only pass optimal when the moves written are
+    # the optimal solution
+    def __init__(self, fileName, numRings, numRods=3, start=1, end=3, optimal=False):
+        if numRods > 4:
+            raise ValueError("move files only support up to 4 rods, got %s" % numRods)
+        self.fileName = fileName
+        self.numRings = numRings
+        self.numRods = numRods
+        self.start = start
+        self.end = end
+        self.optimal = optimal
+        self.numMoves = 0
+        self.crc = 0
+        # Code waiting for a partner to fill its byte
+        self.pending = None
+        self.file = open(fileName, "wb")
+        self.file.write(bytes(HEADER.size))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def writeBytes(self, data):
+        self.crc = zlib.crc32(data, self.crc)
+        self.file.write(data)
+
+    def write(self, start, end):
+        code = encodeMove(start, end)
+        self.numMoves += 1
+        if self.pending is None:
+            self.pending = code
+        else:
+            self.writeBytes(bytes(((code << 4) | self.pending,)))
+            self.pending = None
+
+    def writeMoves(self, moves, chunkSize=1 << 16):
+        # Write (start, end) pairs from an iterable, such as the solveHanoi generator
+        chunk = []
+        for start, end in moves:
+            chunk.append(encodeMove(start, end))
+            if len(chunk) == chunkSize:
+                self.writeCodes(chunk)
+                chunk = []
+        self.writeCodes(chunk)
+
+    def writeCodes(self, codes):
+        # Write an array of encoded moves, the fast path for batch generated solutions
+        codes = np.asarray(codes, dtype=np.uint8)
+        if len(codes) == 0:
+            return
+        self.numMoves += len(codes)
+        if self.pending is not None:
+            codes = np.concatenate(([self.pending], codes)).astype(np.uint8)
+            self.pending = None
+        if len(codes) % 2:
+            self.pending = int(codes[-1])
+            codes = codes[:-1]
+        self.writeBytes(packMoves(codes))
+
+    def close(self):
+        if self.file.closed:
+            return
+        if self.pending is not None:
+            self.writeBytes(bytes((self.pending,)))
+            self.pending = None
+        self.file.seek(0)
+        flags = FLAG_OPTIMAL if self.optimal else 0
+        self.file.write(HEADER.pack(MAGIC, VERSION, self.numRings, self.numRods,
+                                    self.start, self.end, flags, self.numMoves, self.crc))
+        self.file.close()
+
+
+class MoveFileReader:
+    # Memory mapped reader, gives random access to the moves without loading the file
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.file = open(fileName, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.data) < HEADER.size:
+            self.close()
+            raise ValueError("'%s' is too short to be a move file" % fileName)
+        magic, version, self.numRings, self.numRods, self.start, self.end, flags, self.numMoves, self.crc = \
+            HEADER.unpack_from(self.data)
+        if magic != MAGIC or not 1 <= version <= VERSION:
+            self.close()
+            raise ValueError("'%s' is not a version 1 to %s move file" % (fileName, VERSION))
+        # Whether the writer says the moves are the optimal solution, this isn't checked
+        self.optimal = bool(flags & FLAG_OPTIMAL)
+        if len(self.data) != HEADER.size + (self.numMoves + 1) // 2:
+            self.close()
+            raise ValueError("'%s' is truncated, expected %s moves" % (fileName, self.numMoves))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def __len__(self):
+        return self.numMoves
+
+    def __getitem__(self, k):
+        # Returns the (start, end) rods of move k
+        if k < 0:
+            k += self.numMoves
+        if not 0 <= k < self.numMoves:
+            raise IndexError("move %s out of range for %s moves" % (k, self.numMoves))
+        byte = self.data[HEADER.size + k // 2]
+        code = byte >> 4 if k % 2 else byte & 15
+        return (code >> 2) + 1, (code & 3) + 1
+
+    def __iter__(self):
+        return self.iterMoves()
+
+    def getCodes(self, first=0, count=None):
+        # Returns the encoded moves first to first + count as a uint8 array
+        if count is None:
+            count = self.numMoves - first
+        if first < 0 or count < 0 or first + count > self.numMoves:
+            raise IndexError("moves %s to %s out of range for %s moves" % (first, first + count, self.numMoves))
+        lo = HEADER.size + first // 2
+        hi = HEADER.size + (first + count + 1) // 2
+        offset = first % 2
+        return unpackMoves(self.data[lo:hi])[offset:offset + count]
+
+    def iterCodes(self, first=0, chunkSize=1 << 16):
+        # Yields arrays of encoded moves from first to the end of the file
+        for lo in range(first, self.numMoves, chunkSize):
+            yield self.getCodes(lo, min(chunkSize, self.numMoves - lo))
+
+    def iterMoves(self, first=0, chunkSize=1 << 16):
+        # Yields (start, end) rods of each move from first on, decoded a chunk at a time
+        for codes in self.iterCodes(first, chunkSize):
+            starts, ends = decodeMoves(codes)
+            yield from zip(starts.tolist(), ends.tolist())
+
+    def verify(self, chunkSize=1 << 20):
+        # True if the moves match the CRC stored in the header
+        crc = 0
+        payload = memoryview(self.data)[HEADER.size:]
+        for lo in range(0, len(payload), chunkSize):
+            crc = zlib.crc32(payload[lo:lo + chunkSize], crc)
+        payload.release()
+        return crc == self.crc
+
+    def findNonOptimalMove(self, chunkSize=1 << 20):
+        # Index of the first move that isn't the optimal solution's move for the file's ring
+        # count and rods, the optimal move count if the file stops short, or -1 if the file is
+        # exactly the optimal solution. Only 3 rods have a known optimal solution
+        if self.numRods != 3:
+            raise ValueError("optimal solutions are only known for 3 rods, '%s' has %s" %
+                             (self.fileName, self.numRods))
+        total = (1 << self.numRings) - 1
+        count = min(self.numMoves, total)
+        for first in range(0, count, chunkSize):
+            codes = self.getCodes(first, min(chunkSize, count - first))
+            expected = solveHanoiArray(self.numRings, self.start, self.end, first=first, count=len(codes))
+            mismatch = np.flatnonzero(codes != expected)
+            if len(mismatch):
+                return first + int(mismatch[0])
+        if self.numMoves != total:
+            return count
+        return -1
+
+    def close(self):
+        if not self.data.closed:
+            self.data.close()
+        self.file.close()
+
+
+def exportHanoi(fileName, n, start=1, end=3, chunkSize=1 << 20):
+    # Writes the optimal solution for n rings to a move file, using the batch solver
+    total = (1 << n) - 1
+    with MoveFileWriter(fileName, n, 3, start, end, optimal=True) as writer:
+        for first in range(0, total, chunkSize):
+            writer.writeCodes(solveHanoiArray(n, start, end, first=first, count=min(chunkSize, total - first)))
@@ -0,0 +1,96 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from HanoiSolver import encodeMove, solveHanoiArray
+
+# Parallel export of solutions too large to generate on one core. The top levels of the
+# recursion are split off into independent sub-problems of n - depth rings with relabelled
+# rods, each worker process solves its sub-problem straight into its slice of a shared
+# memory mapped .npy file. The parent only writes the single moves between them
+
+
+def splitSolution(n, start, end, depth):
+    # Returns the sub-problems as (offset, rings, start, end) and the moves between them as
+    # (offset, code), where offset is the index of their first move in the full solution
+    subProblems = []
+    moves = []
+    stack = [(0, n, start, end, depth)]
+    while stack:
+        offset, rings, start, end, depth = stack.pop()
+        if depth == 0 or rings == 0:
+            subProblems.append((offset, rings, start, end))
+            continue
+        other = 6 - (start + end)
+        half = (1 << (rings - 1)) - 1
+        moves.append((offset + half, encodeMove(start, end)))
+        stack.append((offset + half + 1, rings - 1, other, end, depth - 1))
+        stack.append((offset, rings - 1, start, other, depth - 1))
+    return subProblems, moves
+
+
+def defaultDepth(n, workers):
+    # Enough sub-problems to keep every worker busy even if some finish early
+    depth = 0
+    while (1 << depth) < 4 * workers:
+        depth += 1
+    return min(depth, n)
+
+
+def solveSlice(fileName, offset, rings, start, end):
+    out = np.load(fileName, mmap_mode="r+")
+    count = (1 << rings) - 1
+    solveHanoiArray(rings, start, end, out[offset:offset + count])
+    out.flush()
+    return count
+
+
+def checkSlice(fileName, offset, rings, start, end, chunkSize=1 << 20):
+    # Index of the first move in the slice that differs from the optimal solution, or -1
+    moves = np.load(fileName, mmap_mode="r")
+    count = (1 << rings) - 1
+    for first in range(0, count, chunkSize):
+        expected = solveHanoiArray(rings, start, end, first=first, count=min(chunkSize, count - first))
+        mismatch = np.flatnonzero(moves[offset + first:offset + first + len(expected)] != expected)
+        if len(mismatch):
+            return offset + first + int(mismatch[0])
+    return -1
+
+
+def saveHanoiArrayParallel(fileName, n, start=1, end=3, workers=None, depth=None):
+    # Parallel version of HanoiSolver.saveHanoiArray
+    workers = workers or os.cpu_count() or 1
+    if depth is None:
+        depth = defaultDepth(n, workers)
+    subProblems, moves = splitSolution(n, start, end, depth)
+
+    out = np.lib.format.open_memmap(fileName, mode="w+", dtype=np.uint8, shape=((1 << n) - 1,))
+    for offset, code in moves:
+        out[offset] = code
+    out.flush()
+    del out
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(solveSlice, fileName, *subProblem) for subProblem in subProblems]
+        for future in futures:
+            future.result()
+    return np.load(fileName, mmap_mode="r")
+
+
+def verifyHanoiArrayParallel(fileName, n, start=1, end=3, workers=None, depth=None):
+    # Checks a .npy solution against the optimal one, returns the index of the first
+    # wrong move or -1
+    workers = workers or os.cpu_count() or 1
+    if depth is None:
+        depth = defaultDepth(n, workers)
+    subProblems, moves = splitSolution(n, start, end, depth)
+
+    solution = np.load(fileName, mmap_mode="r")
+    if len(solution) != (1 << n) - 1:
+        return min(len(solution), (1 << n) - 1)
+    wrong = [offset for offset, code in moves if solution[offset] != code]
+    del solution
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(checkSlice, fileName, *subProblem) for subProblem in subProblems]
+        wrong += [index for index in (future.result() for future in futures) if index != -1]
+    return min(wrong) if wrong else -1
@@ -0,0 +1,129 @@
+from OpenGL.GL import *
+from Shader import Shader
+
+# Draws are collected from the whole scene into a queue, sorted so draws sharing a program,
+# VAO, material and textures are next to each other, then submitted through a cache of the
+# GL state that skips any bind to the value already bound
+
+
+class DrawItem:
+    # One draw call and the state it needs. setup sets the owner's own uniforms (e.g. its model
+    # matrix), it is skipped when the previous draw on the same program had the same owner.
+    # textures are (unit, target, id) and materialRange is (binding, buffer, offset, size)
+    __slots__ = ("layer", "shader", "vertexArrayObject", "textures", "materialRange", "owner", "setup", "draw")
+
+    def __init__(self, shader, vertexArrayObject, draw, textures=(), materialRange=None, owner=None, setup=None,
+                 layer=0):
+        self.layer = layer
+        self.shader = shader
+        self.vertexArrayObject = vertexArrayObject
+        self.textures = textures
+        self.materialRange = materialRange
+        self.owner = owner
+        self.setup = setup
+        self.draw = draw
+
+    def sortKey(self):
+        # Layer first, so e.g. the skybox still goes last, then program -> VAO -> material -> texture
+        return (self.layer, self.shader.program, self.vertexArrayObject,
+                self.materialRange[1:3] if self.materialRange else (0, 0),
+                tuple(texture[2] for texture in self.textures))
+
+
+class GLStateCache:
+    # Last value bound for each piece of state, with counts of the binds issued and of the
+    # ones skipped as redundant since the last resetCounts
+    KINDS = ("program", "vertexArray", "texture", "uniformBuffer", "uniforms")
+
+    def __init__(self):
+        self.invalidate()
+        self.resetCounts()
+
+    def invalidate(self):
+        # Forget what is bound, e.g. after other code has changed state behind our back
+        self.vertexArrayObject = None
+        self.activeUnit = None
+        self.textures = {}
+        self.bufferRanges = {}
+        self.owners = {}
+
+    def resetCounts(self):
+        self.issued = dict.fromkeys(self.KINDS, 0)
+        self.avoided = dict.fromkeys(self.KINDS, 0)
+
+    def useProgram(self, shader):
+        if Shader.current == shader.program:
+            self.avoided["program"] += 1
+            return
+        shader.use()
+        self.issued["program"] += 1
+
+    def bindVertexArray(self, vertexArrayObject):
+        if self.vertexArrayObject == vertexArrayObject:
+            self.avoided["vertexArray"] += 1
+            return
+        glBindVertexArray(vertexArrayObject)
+        self.vertexArrayObject = vertexArrayObject
+        self.issued["vertexArray"] += 1
+
+    def bindTexture(self, unit, target, textureId):
+        if self.textures.get((unit, target)) == textureId:
+            self.avoided["texture"] += 1
+            return
+        if self.activeUnit != unit:
+            glActiveTexture(GL_TEXTURE0 + unit)
+            self.activeUnit = unit
+        glBindTexture(target, textureId)
+        self.textures[(unit, target)] = textureId
+        self.issued["texture"] += 1
+
+    def bindBufferRange(self, binding, buffer, offset, size):
+        if self.bufferRanges.get(binding) == (buffer, offset, size):
+            self.avoided["uniformBuffer"] += 1
+            return
+        glBindBufferRange(GL_UNIFORM_BUFFER, binding, buffer, offset, size)
+        self.bufferRanges[binding] = (buffer, offset, size)
+        self.issued["uniformBuffer"] += 1
+
+    def setUniforms(self, item):
+        # Per owner uniforms only need setting again if another owner drew with the program since
+        if item.setup is None:
+            return
+        program = item.shader.program
+        if item.owner is not None and self.owners.get(program) is item.owner:
+            self.avoided["uniforms"] += 1
+            return
+        item.setup()
+        self.owners[program] = item.owner
+        self.issued["uniforms"] += 1
+
+    def report(self):
+        return ", ".join("%s %s issued/%s avoided" % (kind, self.issued[kind], self.avoided[kind])
+                         for kind in self.KINDS)
+
+
+class RenderQueue:
+    def __init__(self):
+        self.items = []
+
+    def submit(self, item):
+        self.items.append(item)
+
+    def flush(self, state=None):
+        # Sorts and draws everything queued, then empties the queue
+        if state is None:
+            state = GLStateCache()
+        # Owners' uniforms may have changed since the last flush
+        state.owners.clear()
+        self.items.sort(key=DrawItem.sortKey)
+        for item in self.items:
+            state.useProgram(item.shader)
+            state.bindVertexArray(item.vertexArrayObject)
+            for unit, target, textureId in item.textures:
+                state.bindTexture(unit, target, textureId)
+            if item.materialRange:
+                state.bindBufferRange(*item.materialRange)
+            state.setUniforms(item)
+            item.draw()
+        self.items.clear()
+        return state
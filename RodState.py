@@ -0,0 +1,217 @@
+import numpy as np
+
+# Compact puzzle state, each rod is an integer bitmask with bit d set when disk d is on it.
+# Disk 0 is the smallest, so the top ring of a rod is its lowest set bit and a move is
+# legal when the moved ring's bit is lower than the target rod's lowest set bit
+
+
+def topBit(rod):
+    return rod & -rod
+
+
+class RodState:
+    def __init__(self, rods):
+        self.rods = list(rods)
+
+    @classmethod
+    def start(cls, numRings, numRods=3, rod=1):
+        # All rings stacked on one rod
+        rods = [0] * numRods
+        rods[rod-1] = (1 << numRings) - 1
+        return cls(rods)
+
+    @classmethod
+    def fromConfiguration(cls, config, numRods=3):
+        # From a list of the rod each disk is on, as returned by HanoiSolver.getConfiguration
+        rods = [0] * numRods
+        for disk, rod in enumerate(config):
+            rods[rod-1] |= 1 << disk
+        return cls(rods)
+
+    def toConfiguration(self):
+        config = [0] * self.numRings
+        for i, rod in enumerate(self.rods):
+            for disk in self.disks(i+1):
+                config[disk] = i + 1
+        return config
+
+    def copy(self):
+        return RodState(self.rods)
+
+    @property
+    def numRings(self):
+        return sum(self.rods).bit_length()
+
+    def disks(self, rod):
+        # Disks on a rod from the bottom (largest) to the top (smallest)
+        bits = self.rods[rod-1]
+        return [d for d in range(bits.bit_length() - 1, -1, -1) if bits >> d & 1]
+
+    def top(self, rod):
+        # Smallest disk on a rod, or -1 if it is empty
+        return topBit(self.rods[rod-1]).bit_length() - 1
+
+    def canMove(self, start, end):
+        if start == end:
+            return False
+        src = self.rods[start-1]
+        dst = self.rods[end-1]
+        return src != 0 and (dst == 0 or topBit(src) < topBit(dst))
+
+    def move(self, start, end):
+        # Moves the top ring from start to end, returns the disk moved
+        if not self.canMove(start, end):
+            raise ValueError("illegal move from rod %s to rod %s" % (start, end))
+        bit = topBit(self.rods[start-1])
+        self.rods[start-1] ^= bit
+        self.rods[end-1] |= bit
+        return bit.bit_length() - 1
+
+    def __eq__(self, other):
+        return isinstance(other, RodState) and self.rods == other.rods
+
+    def __repr__(self):
+        return "RodState(%s)" % self.rods
+
+
+def validateMoves(moves, state):
+    # Applies (start, end) moves to state, returns the index of the first illegal move,
+    # or -1 if they are all legal. State is updated up to the illegal move
+    rods = state.rods
+    numRods = len(rods)
+    for k, (start, end) in enumerate(moves):
+        if start == end or not (0 < start <= numRods and 0 < end <= numRods):
+            return k
+        src = rods[start-1]
+        dst = rods[end-1]
+        bit = src & -src
+        if src == 0 or (dst != 0 and (dst & -dst) < bit):
+            return k
+        rods[start-1] = src ^ bit
+        rods[end-1] = dst | bit
+    return -1
+
+
+def stackDisks(rods, numRings):
+    # (numRods, numRings + 1) table of the disks on each rod from the bottom up, -1 padded
+    table = np.full((len(rods), numRings + 1), -1, dtype=np.intp)
+    for r, bits in enumerate(rods):
+        disks = [d for d in range(bits.bit_length() - 1, -1, -1) if bits >> d & 1]
+        table[r, :len(disks)] = disks
+    return table
+
+
+def applyCodes(starts, ends, rods):
+    # Vectorised rule check of well formed moves, rods counted from 0, from the state rods.
+    # Returns the index of the first illegal move, or -1 and the rods after every move.
+    #
+    # Each rod is a stack, and a slot is a (rod, height) pair. Each move reads the slot it pops
+    # and the slot under the one it pushes, then writes the slot it pushes. The stack heights
+    # before every move are a cumulative sum, and a stable sort of the slot accesses by slot
+    # finds the move that last wrote each slot read. A move's disk is the one moved by that
+    # writer, or the slot's starting disk if nothing wrote it, found for all the moves at once
+    # by pointer jumping back along each disk's chain of moves
+    count = len(starts)
+    numRods = len(rods)
+    numRings = max(sum(rods).bit_length(), 1)
+    disksOnRod = stackDisks(rods, numRings)
+    heights = np.array([bin(bits).count("1") for bits in rods], dtype=np.intp)
+    moves = np.arange(count)
+
+    deltas = np.zeros((count, numRods), dtype=np.intp)
+    deltas[moves, starts] = -1
+    deltas[moves, ends] = 1
+    heightsBefore = np.cumsum(deltas, axis=0) - deltas + heights
+    popHeights = heightsBefore[moves, starts]
+    pushHeights = heightsBefore[moves, ends]
+
+    # Slot accesses in time order, heights clamped as after an illegal move they are meaningless
+    width = numRings + 2
+    slots = np.empty((count, 3), dtype=np.int16 if numRods * width < 1 << 15 else np.int32)
+    slots[:, 0] = starts * width + np.clip(popHeights, 0, width - 1)
+    slots[:, 1] = ends * width + np.clip(pushHeights, 0, width - 1)
+    slots[:, 2] = ends * width + np.clip(pushHeights + 1, 0, width - 1)
+    slots = slots.ravel()
+    order = np.argsort(slots, kind="stable")
+    sortedSlots = slots[order]
+    positions = np.arange(len(slots))
+    lastWrite = np.maximum.accumulate(np.where(order % 3 == 2, positions, -1))
+    newSlot = np.ones(len(slots), dtype=bool)
+    newSlot[1:] = sortedSlots[1:] != sortedSlots[:-1]
+    slotStart = np.maximum.accumulate(np.where(newSlot, positions, 0))
+    writers = np.empty(len(slots), dtype=np.intp)
+    writers[order] = np.where(lastWrite >= slotStart, order[np.maximum(lastWrite, 0)] // 3, -1)
+    writers = writers.reshape(count, 3)
+
+    def startingDisks(rodIndices, slotHeights):
+        # Disks on the rods before the first move, -1 for an empty slot
+        return np.where(slotHeights >= 0, disksOnRod[rodIndices, np.clip(slotHeights, 0, numRings)], -1)
+
+    # The first move of each disk points at itself, its later moves at the move before
+    pointers = np.where(writers[:, 0] >= 0, writers[:, 0], moves)
+    while True:
+        nextPointers = pointers[pointers]
+        if np.array_equal(nextPointers, pointers):
+            break
+        pointers = nextPointers
+    disks = startingDisks(starts[pointers], popHeights[pointers] - 1)
+    under = np.where(writers[:, 1] >= 0, disks[np.maximum(writers[:, 1], 0)], startingDisks(ends, pushHeights - 1))
+    illegal = np.flatnonzero((popHeights <= 0) | (disks < 0) | ((pushHeights > 0) & (under < disks)))
+    if len(illegal):
+        return int(illegal[0]), None
+
+    # Rebuild the rods from the last disk written to each of their slots
+    groupEnds = np.append(newSlot[1:], True)
+    finalWriters = np.full(numRods * width, -1, dtype=np.intp)
+    ended = lastWrite[groupEnds] >= slotStart[groupEnds]
+    finalWriters[sortedSlots[groupEnds][ended]] = order[lastWrite[groupEnds][ended]] // 3
+    finalHeights = heightsBefore[-1] + deltas[-1]
+    result = []
+    for r in range(numRods):
+        bits = 0
+        for h in range(finalHeights[r]):
+            writer = finalWriters[r * width + h + 1]
+            bits |= 1 << int(disks[writer] if writer >= 0 else disksOnRod[r, h])
+        result.append(bits)
+    return -1, result
+
+
+def validateCodes(codes, state, first=0, chunkSize=1 << 14):
+    # Batched path for arrays of encoded moves. Malformed codes (a rod moving onto itself or
+    # past the rod count) are found with a vectorised pass, then the rules are checked with
+    # applyCodes a chunk at a time, small enough for the temporaries to stay in cache.
+    # Returns the index of the first illegal move plus first, or -1. State is updated up to
+    # the illegal move
+    codes = np.asarray(codes, dtype=np.uint8)
+    numRods = len(state.rods)
+    starts = (codes >> 2).astype(np.intp)
+    ends = (codes & 3).astype(np.intp)
+    malformed = np.flatnonzero((starts == ends) | (starts >= numRods) | (ends >= numRods))
+    count = int(malformed[0]) if len(malformed) else len(codes)
+
+    for lo in range(0, count, chunkSize):
+        hi = min(lo + chunkSize, count)
+        illegal, rods = applyCodes(starts[lo:hi], ends[lo:hi], state.rods)
+        if illegal != -1:
+            # Apply the legal moves before it, so the state is where the illegal move was made
+            if illegal:
+                state.rods[:] = applyCodes(starts[lo:lo + illegal], ends[lo:lo + illegal], state.rods)[1]
+            return first + lo + illegal
+        state.rods[:] = rods
+    if count < len(codes):
+        return first + count
+    return -1
+
+
+def validateMoveFile(reader, state=None, count=None, chunkSize=1 << 16):
+    # Checks the first count moves in a MoveFile.MoveFileReader, by default all of them,
+    # starting from all rings on its start rod
+    if state is None:
+        state = RodState.start(reader.numRings, reader.numRods, reader.start)
+    if count is None:
+        count = len(reader)
+    for first in range(0, count, chunkSize):
+        illegal = validateCodes(reader.getCodes(first, min(chunkSize, count - first)), state, first)
+        if illegal != -1:
+            return illegal
+    return -1
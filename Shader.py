@@ -3,7 +3,79 @@ from lab_utils import Mat3, Mat4
 from OpenGL.GL import *
 
 
+def _matrixSetter(glUniformMatrix):
+    def setMatrix(loc, value):
+        glUniformMatrix(loc, 1, GL_TRUE, value.getData())
+    return setMatrix
+
+
+def _vectorSetter(glUniformv):
+    def setVector(loc, value):
+        glUniformv(loc, 1, value)
+    return setVector
+
+
+def _intSetter(loc, value):
+    glUniform1i(loc, int(value))
+
+
+# Setter for each active uniform type, picked once when the program is introspected rather
+# than by checking the Python type of every value set
+UNIFORM_SETTERS = {
+    GL_FLOAT: glUniform1f,
+    GL_FLOAT_VEC2: _vectorSetter(glUniform2fv),
+    GL_FLOAT_VEC3: _vectorSetter(glUniform3fv),
+    GL_FLOAT_VEC4: _vectorSetter(glUniform4fv),
+    GL_INT: _intSetter,
+    GL_BOOL: _intSetter,
+    GL_SAMPLER_2D: _intSetter,
+    GL_SAMPLER_CUBE: _intSetter,
+    GL_FLOAT_MAT3: _matrixSetter(glUniformMatrix3fv),
+    GL_FLOAT_MAT4: _matrixSetter(glUniformMatrix4fv),
+}
+
+
+_INT_VECTOR_SETTERS = {2: glUniform2iv, 3: glUniform3iv, 4: glUniform4iv}
+_UINT_VECTOR_SETTERS = {2: glUniform2uiv, 3: glUniform3uiv, 4: glUniform4uiv}
+_FLOAT_VECTOR_SETTERS = {2: glUniform2fv, 3: glUniform3fv, 4: glUniform4fv}
+
+
+def _genericSetter(uniformName, uniformType):
+    # For uniform types with no setter in UNIFORM_SETTERS (e.g. ivec, uvec, mat2), picks the
+    # glUniform call from the type of each value, as setUniform did before the setters
+    def setGeneric(loc, value):
+        if isinstance(value, (Mat3, Mat4)):
+            value._set_open_gl_uniform(loc)
+        elif isinstance(value, (bool, int, np.integer)):
+            glUniform1i(loc, int(value))
+        elif isinstance(value, (float, np.floating)):
+            glUniform1f(loc, float(value))
+        elif isinstance(value, (np.ndarray, list, tuple)) and len(value) in _FLOAT_VECTOR_SETTERS:
+            array = np.asarray(value)
+            if array.dtype.kind == "u":
+                _UINT_VECTOR_SETTERS[len(array)](loc, 1, array.astype(np.uint32))
+            elif array.dtype.kind in "ib":
+                _INT_VECTOR_SETTERS[len(array)](loc, 1, array.astype(np.int32))
+            else:
+                _FLOAT_VECTOR_SETTERS[len(array)](loc, 1, array.astype(np.float32))
+        else:
+            raise TypeError("can't set uniform '%s' of GL type 0x%04X from a %s" %
+                            (uniformName, uniformType, type(value).__name__))
+    return setGeneric
+
+
+# Fixed binding point for each uniform block. Every program binds the blocks it declares to
+# these when it is linked, so one buffer bound to a point serves all of them
+UNIFORM_BLOCK_BINDINGS = {
+    "MaterialProperties": 0,
+    "FrameConstants": 1,
+    "Lights": 2,
+}
+
+
 class Shader:
+    # Program currently bound, so use() can skip redundant glUseProgram calls
+    current = None
 
     def __init__(self, vertFile='shaders/vertex.glsl', fragFile='shaders/fragment.glsl'):
         # , attribLocs=None, fragDataLocs={}):
@@ -41,6 +113,40 @@ class Shader:
         glDeleteShader(vertexShader)
         glDeleteShader(fragmentShader)
 
+        self.uniforms = self.getActiveUniforms()
+        self.setters = {}
+        self.uniformBlocks = self.bindUniformBlocks()
+
+    def bindUniformBlocks(self):
+        # Binds the blocks this program declares to their fixed binding points, returns them as name -> index
+        uniformBlocks = {}
+        for name, binding in UNIFORM_BLOCK_BINDINGS.items():
+            index = glGetUniformBlockIndex(self.program, name)
+            if index != GL_INVALID_INDEX:
+                glUniformBlockBinding(self.program, index, binding)
+                uniformBlocks[name] = index
+        return uniformBlocks
+
+    def getActiveUniforms(self):
+        # Name -> (location, type, size) of every active uniform, queried once after linking.
+        # Arrays are listed by their first element, so every element is added under its own name
+        uniforms = {}
+        for i in range(glGetProgramiv(self.program, GL_ACTIVE_UNIFORMS)):
+            name, size, uniformType = glGetActiveUniform(self.program, i)
+            name = name.decode() if isinstance(name, bytes) else name
+            loc = glGetUniformLocation(self.program, name)
+            # Uniforms in blocks have no location, they are set through buffers
+            if loc == -1:
+                continue
+            if name.endswith("[0]"):
+                base = name[:-3]
+                uniforms[base] = (loc, uniformType, size)
+                for k in range(1, size):
+                    uniforms["%s[%s]" % (base, k)] = (glGetUniformLocation(self.program, "%s[%s]" % (base, k)),
+                                                      uniformType, 1)
+            uniforms[name] = (loc, uniformType, size)
+        return uniforms
+
     def compileShader(self, source, shaderType):
         try:
             shader = glCreateShader(shaderType)
@@ -60,27 +166,37 @@ class Shader:
             raise
 
     def use(self):
-        glUseProgram(self.program)
+        if Shader.current != self.program:
+            glUseProgram(self.program)
+            Shader.current = self.program
+
+    @staticmethod
+    def unbind():
+        glUseProgram(0)
+        Shader.current = None
+
+    def uniformSetter(self, uniformName):
+        # Setter prebound to the uniform's location and type, taking just the value. Uniforms
+        # that are not active (e.g. optimised out) get a setter that does nothing, as setting
+        # location -1 would. The caller makes sure this shader is in use
+        setter = self.setters.get(uniformName)
+        if setter is None:
+            if uniformName in self.uniforms:
+                loc, uniformType, size = self.uniforms[uniformName]
+                setType = UNIFORM_SETTERS.get(uniformType) or _genericSetter(uniformName, uniformType)
+
+                def setter(value):
+                    setType(loc, value)
+            else:
+                def setter(value):
+                    pass
+            self.setters[uniformName] = setter
+        return setter
 
     def setUniform(self, uniformName, value):
         # Make sure this shader is in use before setting uniforms
         self.use()
-        loc = glGetUniformLocation(self.program, uniformName)
-        if isinstance(value, float):
-            glUniform1f(loc, value)
-        elif isinstance(value, int):
-            glUniform1i(loc, value)
-        elif isinstance(value, (np.ndarray, list)):
-            if len(value) == 2:
-                glUniform2fv(loc, 1, value)
-            if len(value) == 3:
-                glUniform3fv(loc, 1, value)
-            if len(value) == 4:
-                glUniform4fv(loc, 1, value)
-        elif isinstance(value, (Mat3, Mat4)):
-            value._set_open_gl_uniform(loc)
-        else:
-            assert False  # If this happens the type was not supported, check your argument types and either add a new else case above or change the type
+        self.uniformSetter(uniformName)(value)
 
     def getShaderInfoLog(self, obj):
         logLength = glGetShaderiv(obj, GL_INFO_LOG_LENGTH)
@@ -1,6 +1,7 @@
 from ctypes import c_float, c_void_p
 from lab_utils import make_scale
 from Shader import Shader
+from RenderQueue import DrawItem
 from OpenGL.GL import *
 from PIL import Image
 
@@ -95,17 +96,14 @@ class SkyBox:
         glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, 3 * sizeof(GLfloat), c_void_p(0))
         glEnableVertexAttribArray(0)
 
-    def draw(self, view, projection):
-        glDepthMask(GL_FALSE)
-        glDepthFunc(GL_LEQUAL)
-        self.shader.use()
-        self.shader.setUniform("view", view)
-        self.shader.setUniform("projection", projection)
-        self.shader.setUniform("model", make_scale(self.scale))
-        glBindVertexArray(self._vao)
-        glActiveTexture(GL_TEXTURE0)
-        glBindTexture(GL_TEXTURE_CUBE_MAP, self.id)
-        glDrawArrays(GL_TRIANGLES, 0, 36)
-        glBindVertexArray(0)
-        glDepthMask(GL_TRUE)
-        glDepthFunc(GL_LEQUAL)
+    def queue(self, renderQueue):
+        # Drawn after everything else, where only the pixels nothing covered pass the depth test
+        def draw():
+            glDepthMask(GL_FALSE)
+            glDepthFunc(GL_LEQUAL)
+            glDrawArrays(GL_TRIANGLES, 0, 36)
+            glDepthMask(GL_TRUE)
+
+        renderQueue.submit(DrawItem(self.shader, self._vao, draw, textures=((0, GL_TEXTURE_CUBE_MAP, self.id),),
+                                    owner=self, setup=lambda: self.shader.setUniform("model", make_scale(self.scale)),
+                                    layer=1))
@@ -0,0 +1,73 @@
+from collections import OrderedDict
+import os
+from Texture import Texture
+
+
+class TextureManager:
+    # Loads each texture file once, keyed by its normalised absolute path and whether it is
+    # sRGB, and hands the same Texture to everything that asks for it. Textures are reference
+    # counted, ones no longer used stay cached for reuse until the cache is over its byte
+    # budget, then the least recently used of them are deleted first
+
+    def __init__(self, budgetBytes=256 << 20):
+        self.budgetBytes = budgetBytes
+        # key -> [texture, refCount, sizeBytes], least recently used first
+        self.entries = OrderedDict()
+        self.keysById = {}
+        self.totalBytes = 0
+        self.defaultTexture = None
+        self.defaultNormalTexture = None
+
+    @staticmethod
+    def getKey(filePath, srgb):
+        return os.path.normcase(os.path.abspath(filePath)), bool(srgb)
+
+    def acquire(self, filePath, srgb=False):
+        key = self.getKey(filePath, srgb)
+        entry = self.entries.get(key)
+        if entry is None:
+            texture = Texture(filePath, srgb=srgb)
+            # RGBA8 plus about a third again for the mip chain
+            sizeBytes = texture.width * texture.height * 4 * 4 // 3
+            entry = [texture, 0, sizeBytes]
+            self.entries[key] = entry
+            self.keysById[texture.id] = key
+            self.totalBytes += sizeBytes
+        self.entries.move_to_end(key)
+        entry[1] += 1
+        self.evict()
+        return entry[0]
+
+    def release(self, texture):
+        key = self.keysById.get(texture.id)
+        if key is None:
+            return
+        entry = self.entries[key]
+        assert entry[1] > 0
+        entry[1] -= 1
+        self.evict()
+
+    def evict(self):
+        # Deletes unused textures, least recently used first, until the cache fits its budget
+        for key in [key for key, entry in self.entries.items() if entry[1] == 0]:
+            if self.totalBytes <= self.budgetBytes:
+                break
+            texture, refCount, sizeBytes = self.entries.pop(key)
+            del self.keysById[texture.id]
+            self.totalBytes -= sizeBytes
+            texture.delete()
+
+    def getDefaultTexture(self):
+        # 1x1 grey texture bound in place of missing maps, shared by everything
+        if self.defaultTexture is None:
+            self.defaultTexture = Texture()
+        return self.defaultTexture
+
+    def getDefaultNormalTexture(self):
+        if self.defaultNormalTexture is None:
+            self.defaultNormalTexture = Texture(mapType="normal")
+        return self.defaultNormalTexture
+
+
+# Shared by all meshes
+textureManager = TextureManager()
@@ -0,0 +1,32 @@
+import numpy as np
+
+
+class Trajectory:
+    # Piecewise linear path through keyframe control points, travelled at a constant speed.
+    # Segment durations are worked out once up front, so the position at any time is
+    # evaluated in closed form rather than stepped frame by frame
+    def __init__(self, points, speed=1.0):
+        self.points = np.array(points, dtype=np.float32)
+        self.durations = np.linalg.norm(np.diff(self.points, axis=0), axis=1) / speed
+        # Time each keyframe is reached
+        self.times = np.concatenate(([0.0], np.cumsum(self.durations)))
+        self.duration = float(self.times[-1])
+
+    @classmethod
+    def liftMove(cls, startPos, endPos, liftHeight, speed=1.0):
+        # Lift straight up off the start rod, across at liftHeight and lower onto the end rod
+        return cls([startPos,
+                    (startPos[0], liftHeight, startPos[2]),
+                    (endPos[0], liftHeight, endPos[2]),
+                    endPos], speed)
+
+    def evaluate(self, t):
+        # Position at time t since the start, clamped to the ends of the path
+        if t <= 0.0:
+            return self.points[0].copy()
+        if t >= self.duration:
+            return self.points[-1].copy()
+        # Last keyframe at or before t, which skips over zero length segments
+        i = np.searchsorted(self.times, t, side="right") - 1
+        u = (t - self.times[i]) / self.durations[i]
+        return self.points[i] + (self.points[i+1] - self.points[i]) * np.float32(u)
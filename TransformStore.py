@@ -0,0 +1,95 @@
+import numpy as np
+
+# Structure of arrays storage for entity transforms. Every entity (ring, rod, table) is just
+# an index into one (N, 3) positions array and one (N, 3) scales array, so per frame updates
+# and building the model matrices are single vectorised operations over all of them, and
+# the matrices of a contiguous range of entities are one contiguous buffer ready for upload.
+# Only the matrices of entities whose position or scale changed are rebuilt, and each rebuild
+# bumps the entity's revision, so anything caching matrices derived from them knows when to update
+
+
+def normalMatrices(matrices):
+    # Inverse transposes of (N, 3, 3) row major matrices in closed form: the cofactor matrix,
+    # whose rows are cross products of the matrix's rows, over the determinant. The shaders
+    # normalise the normals, so a singular matrix just keeps its cofactors rather than dividing by 0
+    rows0, rows1, rows2 = matrices[:, 0], matrices[:, 1], matrices[:, 2]
+    cofactors = np.stack([np.cross(rows1, rows2), np.cross(rows2, rows0), np.cross(rows0, rows1)], axis=1)
+    determinants = np.einsum("ni,ni->n", rows0, cofactors[:, 0])
+    determinants[determinants == 0.0] = 1.0
+    return cofactors / determinants[:, None, None]
+
+
+class TransformStore:
+    def __init__(self, capacity=16):
+        self.count = 0
+        self.positions = np.zeros((capacity, 3), dtype=np.float32)
+        self.scales = np.ones((capacity, 3), dtype=np.float32)
+        # Row major translation * scale matrices, as make_translation(*p) * make_scale(*s), and
+        # their normal matrices, rebuilt by updateMatrices. Identity to match the default transform
+        self.matrices = np.tile(np.identity(4, dtype=np.float32), (capacity, 1, 1))
+        self.normalMatrices = np.tile(np.identity(3, dtype=np.float32), (capacity, 1, 1))
+        # Bumped every time an entity's matrices are rebuilt
+        self.revisions = np.zeros(capacity, dtype=np.int64)
+
+    def __len__(self):
+        return self.count
+
+    def reserve(self, capacity):
+        # Grows the arrays, keeping the existing transforms. Views of the old arrays are
+        # not updated, so entities should hold indices rather than rows
+        if capacity <= len(self.positions):
+            return
+        capacity = max(capacity, 2 * len(self.positions))
+        positions = np.zeros((capacity, 3), dtype=np.float32)
+        scales = np.ones((capacity, 3), dtype=np.float32)
+        matrices = np.tile(np.identity(4, dtype=np.float32), (capacity, 1, 1))
+        normalMatrices = np.tile(np.identity(3, dtype=np.float32), (capacity, 1, 1))
+        revisions = np.zeros(capacity, dtype=np.int64)
+        positions[:self.count] = self.positions[:self.count]
+        scales[:self.count] = self.scales[:self.count]
+        matrices[:self.count] = self.matrices[:self.count]
+        normalMatrices[:self.count] = self.normalMatrices[:self.count]
+        revisions[:self.count] = self.revisions[:self.count]
+        self.positions, self.scales, self.matrices = positions, scales, matrices
+        self.normalMatrices, self.revisions = normalMatrices, revisions
+
+    def add(self, position=(0.0, 0.0, 0.0), scale=(1.0, 1.0, 1.0)):
+        # Returns the index of a new entity
+        return self.addMany(1, position, scale).start
+
+    def addMany(self, count, position=(0.0, 0.0, 0.0), scale=(1.0, 1.0, 1.0)):
+        # Returns a slice of count new, contiguous entities
+        first = self.count
+        self.reserve(first + count)
+        self.count += count
+        self.positions[first:self.count] = position
+        self.scales[first:self.count] = scale
+        return slice(first, self.count)
+
+    def updateMatrices(self):
+        # Rebuilds the model and normal matrices of the entities whose position or scale changed
+        # since, in one pass, returns all the model matrices as an (N, 4, 4) array. The matrices
+        # themselves hold the last position and scale, so nothing has to be marked dirty
+        matrices = self.matrices[:self.count]
+        diagonal = np.arange(3)
+        positions = self.positions[:self.count]
+        scales = self.scales[:self.count]
+        changed = np.flatnonzero(np.any(matrices[:, :3, 3] != positions, axis=1) |
+                                 np.any(matrices[:, diagonal, diagonal] != scales, axis=1))
+        if len(changed):
+            matrices[changed[:, None], diagonal, diagonal] = scales[changed]
+            matrices[changed, :3, 3] = positions[changed]
+            # The inverse transpose of a diagonal scale is just the reciprocal scales. An axis
+            # scaled to nothing keeps 1, so a flattened entity never gets an infinite normal matrix
+            changedScales = scales[changed]
+            self.normalMatrices[changed[:, None], diagonal, diagonal] = np.divide(
+                1.0, changedScales, out=np.ones_like(changedScales), where=changedScales != 0.0)
+            self.revisions[changed] += 1
+        return matrices
+
+    def modelMatrix(self, index):
+        # Model matrix of one entity as of the last updateMatrices
+        return self.matrices[index]
+
+    def normalMatrix(self, index):
+        return self.normalMatrices[index]
@@ -0,0 +1,103 @@
+import numpy as np
+from OpenGL.GL import *
+from Shader import UNIFORM_BLOCK_BINDINGS
+
+# Uniform buffers shared by every program. Each one is bound once to its block's fixed binding
+# point, values are written into a CPU side copy in the block's std140 layout, and only the
+# range that actually changed is uploaded with glBufferSubData, at most once per frame
+
+
+class UniformBuffer:
+    def __init__(self, blockName, size):
+        # size is in bytes, the buffer is kept as float32 with an int32 view for int members
+        self.data = np.zeros(size // 4, dtype=np.float32)
+        self.ints = self.data.view(np.int32)
+        # Range of floats changed since the last upload
+        self.dirtyStart = len(self.data)
+        self.dirtyEnd = 0
+
+        self.buffer = glGenBuffers(1)
+        glBindBuffer(GL_UNIFORM_BUFFER, self.buffer)
+        glBufferData(GL_UNIFORM_BUFFER, self.data, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+        glBindBufferBase(GL_UNIFORM_BUFFER, UNIFORM_BLOCK_BINDINGS[blockName], self.buffer)
+
+    def markDirty(self, start, end):
+        self.dirtyStart = min(self.dirtyStart, start)
+        self.dirtyEnd = max(self.dirtyEnd, end)
+
+    def write(self, offset, values):
+        # Writes floats at a byte offset, only marking them dirty if they changed
+        start = offset // 4
+        values = np.asarray(values, dtype=np.float32).ravel()
+        end = start + len(values)
+        if not np.array_equal(self.data[start:end], values):
+            self.data[start:end] = values
+            self.markDirty(start, end)
+
+    def writeInt(self, offset, value):
+        index = offset // 4
+        if self.ints[index] != value:
+            self.ints[index] = value
+            self.markDirty(index, index + 1)
+
+    def writeMatrix(self, offset, matrix):
+        # std140 matrices are column major, Mat4 is row major
+        self.write(offset, matrix.getData().T)
+
+    def upload(self):
+        if self.dirtyStart >= self.dirtyEnd:
+            return
+        glBindBuffer(GL_UNIFORM_BUFFER, self.buffer)
+        glBufferSubData(GL_UNIFORM_BUFFER, self.dirtyStart * 4, (self.dirtyEnd - self.dirtyStart) * 4,
+                        self.data[self.dirtyStart:self.dirtyEnd])
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+        self.dirtyStart = len(self.data)
+        self.dirtyEnd = 0
+
+
+class FrameConstants(UniformBuffer):
+    # layout(std140) uniform FrameConstants { mat4 view; mat4 projection; vec3 viewPos; }
+    def __init__(self):
+        super().__init__("FrameConstants", 144)
+
+    def setCamera(self, view, projection, viewPos):
+        self.writeMatrix(0, view)
+        self.writeMatrix(64, projection)
+        self.write(128, viewPos)
+
+
+class Lights(UniformBuffer):
+    # layout(std140) uniform Lights { PointLight pointLights[4]; SpotLight spotLight; DirLight dirLight; }
+    # The light structs in lightFrag.glsl order their members so each float fills the padding after a vec3
+    NumPointLights = 4
+    PointLightSize = 64
+    SpotLightOffset = NumPointLights * PointLightSize
+    DirLightOffset = SpotLightOffset + 96
+
+    def __init__(self):
+        super().__init__("Lights", self.DirLightOffset + 64)
+
+    def setPointLight(self, i, position, ambient, diffuse, specular, constant, linear, quadratic):
+        offset = i * self.PointLightSize
+        self.write(offset, [*position, constant, *ambient, linear, *diffuse, quadratic, *specular])
+
+    def setSpotLight(self, ambient, diffuse, specular, constant, linear, quadratic, cutOff, outerCutOff):
+        offset = self.SpotLightOffset
+        self.write(offset + 12, [cutOff])
+        self.write(offset + 28, [outerCutOff])
+        self.write(offset + 32, [*ambient, constant, *diffuse, linear, *specular, quadratic])
+
+    def setSpotLightPose(self, position, direction):
+        self.write(self.SpotLightOffset, position)
+        self.write(self.SpotLightOffset + 16, direction)
+
+    def setSpotLightOn(self, on):
+        self.writeInt(self.SpotLightOffset + 80, int(on))
+
+    def setDirLight(self, direction, ambient, diffuse, specular):
+        offset = self.DirLightOffset
+        self.write(offset, direction)
+        self.write(offset + 16, ambient)
+        self.write(offset + 32, diffuse)
+        self.write(offset + 48, specular)
@@ -0,0 +1,111 @@
+import numpy as np
+
+# Triangle ordering for the GPU's post transform vertex cache. A vertex shared by several
+# triangles is only shaded once if it is still in the cache when the next of them is drawn,
+# so triangles are reordered with Tom Forsyth's linear speed vertex cache optimisation:
+# greedily emit the triangle whose vertices score highest, where vertices score more the
+# more recently they were used and the fewer triangles they have left to go
+
+CACHE_SIZE = 32
+CACHE_DECAY_POWER = 1.5
+LAST_TRIANGLE_SCORE = 0.75
+VALENCE_BOOST_SCALE = 2.0
+VALENCE_BOOST_POWER = 0.5
+
+
+def vertexScore(cachePosition, remainingTriangles, cacheSize=CACHE_SIZE):
+    if remainingTriangles == 0:
+        return -1.0
+    score = 0.0
+    if cachePosition >= 0:
+        if cachePosition < 3:
+            # The last triangle's vertices, fixed so the next triangle doesn't just reuse its edge
+            score = LAST_TRIANGLE_SCORE
+        else:
+            score = (1.0 - (cachePosition - 3) / (cacheSize - 3)) ** CACHE_DECAY_POWER
+    # Vertices with few triangles left are boosted, so they are finished off and leave the cache
+    return score + VALENCE_BOOST_SCALE * remainingTriangles ** -VALENCE_BOOST_POWER
+
+
+def optimizeVertexCache(indices, numVertices, cacheSize=CACHE_SIZE):
+    # Returns the triangles of a flat triangle list of indices reordered for the vertex cache
+    triangles = np.asarray(indices).reshape(-1, 3).tolist()
+    vertexTriangles = [[] for _ in range(numVertices)]
+    for t, triangle in enumerate(triangles):
+        for v in triangle:
+            vertexTriangles[v].append(t)
+
+    cachePositions = [-1] * numVertices
+    vertexScores = [vertexScore(-1, len(ts), cacheSize) for ts in vertexTriangles]
+    triangleScores = [sum(vertexScores[v] for v in triangle) for triangle in triangles]
+    emitted = [False] * len(triangles)
+    cache = []
+    result = []
+
+    best = int(np.argmax(triangleScores)) if triangles else -1
+    while len(result) < len(triangles):
+        if best < 0:
+            # Nothing in the cache has triangles left, start again from the best of the rest
+            best = max((t for t in range(len(triangles)) if not emitted[t]), key=triangleScores.__getitem__)
+        triangle = triangles[best]
+        emitted[best] = True
+        result.append(triangle)
+        for v in triangle:
+            vertexTriangles[v].remove(best)
+
+        # The triangle's vertices move to the front of the cache, pushing the oldest out
+        cache = triangle + [v for v in cache if v not in triangle]
+        evicted = cache[cacheSize:]
+        cache = cache[:cacheSize]
+        for v in evicted:
+            cachePositions[v] = -1
+        for position, v in enumerate(cache):
+            cachePositions[v] = position
+
+        # Only the vertices that moved change score, and so only their triangles
+        for v in cache + evicted:
+            score = vertexScore(cachePositions[v], len(vertexTriangles[v]), cacheSize)
+            delta = score - vertexScores[v]
+            vertexScores[v] = score
+            for t in vertexTriangles[v]:
+                triangleScores[t] += delta
+
+        best = -1
+        bestScore = -1.0
+        for v in cache:
+            for t in vertexTriangles[v]:
+                if triangleScores[t] > bestScore:
+                    best = t
+                    bestScore = triangleScores[t]
+
+    result = np.array(result, dtype=np.uint32).reshape(-1)
+    # The scores model an LRU cache, so an order that was already good for a FIFO one is kept
+    if averageCacheMissRatio(result, cacheSize) >= averageCacheMissRatio(indices, cacheSize):
+        return np.asarray(indices, dtype=np.uint32)
+    return result
+
+
+def reorderVertices(indices, numVertices):
+    # Renumbers the vertices in the order the indices first use them, so vertex fetches walk
+    # through memory too. Returns the new indices and, for each new vertex, its old index
+    indices = np.asarray(indices)
+    used, firstUse = np.unique(indices, return_index=True)
+    order = used[np.argsort(firstUse)]
+    # Vertices no index uses go at the end
+    order = np.concatenate([order, np.setdiff1d(np.arange(numVertices), order)])
+    remap = np.empty(numVertices, dtype=np.uint32)
+    remap[order] = np.arange(numVertices, dtype=np.uint32)
+    return remap[indices], order
+
+
+def averageCacheMissRatio(indices, cacheSize=CACHE_SIZE):
+    # Vertices shaded per triangle with a FIFO cache, 3 is no reuse and about 0.5 is ideal
+    cache = []
+    misses = 0
+    for v in np.asarray(indices).tolist():
+        if v not in cache:
+            misses += 1
+            cache.append(v)
+            if len(cache) > cacheSize:
+                cache.pop(0)
+    return misses / max(len(indices) // 3, 1)
@@ -0,0 +1,117 @@
+import argparse
+import sys
+import time
+from FrameStewart import FrameStewartTable, solveFrameStewart
+from MoveFile import MoveFileReader, MoveFileWriter, exportHanoi
+from ParallelSolver import saveHanoiArrayParallel, verifyHanoiArrayParallel
+from RodState import RodState, validateMoveFile
+
+# Command line tool to export solutions to move files and verify them, e.g.
+#   python export.py export solution.hmv --rings 20
+#   python export.py verify solution.hmv
+#   python export.py array solution.npy --rings 32 --workers 8
+
+
+def export(args):
+    startTime = time.perf_counter()
+    if args.rods == 3:
+        exportHanoi(args.file, args.rings, args.start, args.end)
+        numMoves = (1 << args.rings) - 1
+    else:
+        with MoveFileWriter(args.file, args.rings, args.rods, args.start, args.end) as writer:
+            writer.writeMoves(solveFrameStewart(args.rings, args.rods, args.start, args.end, FrameStewartTable()))
+            numMoves = writer.numMoves
+    elapsed = time.perf_counter() - startTime
+    print("Wrote %s moves for %s rings to '%s' in %.2fs" % (numMoves, args.rings, args.file, elapsed))
+    return 0
+
+
+def exportArray(args):
+    # One byte per move .npy file, generated in parallel across worker processes
+    startTime = time.perf_counter()
+    saveHanoiArrayParallel(args.file, args.rings, args.start, args.end, args.workers)
+    elapsed = time.perf_counter() - startTime
+    print("Wrote %s moves for %s rings to '%s' in %.2fs" % ((1 << args.rings) - 1, args.rings, args.file, elapsed))
+    if args.verify:
+        wrong = verifyHanoiArrayParallel(args.file, args.rings, args.start, args.end, args.workers)
+        if wrong != -1:
+            print("FAILED: move %s is not the optimal move" % wrong)
+            return 1
+        print("Optimal solution OK")
+    return 0
+
+
+def verify(args, chunkSize=1 << 20):
+    with MoveFileReader(args.file) as reader:
+        print("'%s': %s rings, %s rods, %s moves from rod %s to rod %s" %
+              (args.file, reader.numRings, reader.numRods, len(reader), reader.start, reader.end))
+        if not reader.verify():
+            print("FAILED: CRC mismatch")
+            return 1
+        print("CRC OK")
+
+        state = RodState.start(reader.numRings, reader.numRods, reader.start)
+        illegal = validateMoveFile(reader, state)
+        if illegal != -1:
+            print("FAILED: move %s %s breaks the rules" % (illegal, reader[illegal]))
+            return 1
+        if state != RodState.start(reader.numRings, reader.numRods, reader.end):
+            print("FAILED: the moves don't solve the puzzle, they leave %s" % state)
+            return 1
+        print("Moves OK")
+
+        if args.optimal and reader.numRods != 3:
+            print("Skipping optimal check, only supported for 3 rods")
+        elif args.optimal:
+            n = reader.numRings
+            if len(reader) != (1 << n) - 1:
+                print("FAILED: optimal solution has %s moves" % ((1 << n) - 1))
+                return 1
+            mismatch = reader.findNonOptimalMove(chunkSize)
+            if mismatch != -1:
+                print("FAILED: move %s is not the optimal move" % mismatch)
+                return 1
+            print("Optimal solution OK")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export and verify Towers of Hanoi move files")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    exportParser = commands.add_parser("export", help="write the optimal solution to a move file")
+    exportParser.add_argument("file")
+    exportParser.add_argument("--rings", type=int, required=True)
+    exportParser.add_argument("--rods", type=int, default=3, choices=(3, 4))
+    exportParser.add_argument("--start", type=int, default=1, choices=(1, 2, 3, 4))
+    exportParser.add_argument("--end", type=int, choices=(1, 2, 3, 4), help="defaults to the last rod")
+    exportParser.set_defaults(func=export)
+
+    arrayParser = commands.add_parser("array", help="write the optimal solution to a .npy file in parallel")
+    arrayParser.add_argument("file")
+    arrayParser.add_argument("--rings", type=int, required=True)
+    arrayParser.add_argument("--start", type=int, default=1, choices=(1, 2, 3))
+    arrayParser.add_argument("--end", type=int, default=3, choices=(1, 2, 3))
+    arrayParser.add_argument("--workers", type=int, help="defaults to the number of cores")
+    arrayParser.add_argument("--verify", action="store_true", help="check the result afterwards")
+    arrayParser.set_defaults(func=exportArray)
+
+    verifyParser = commands.add_parser("verify", help="check a move file's CRC and that its moves legally solve the puzzle")
+    verifyParser.add_argument("file")
+    verifyParser.add_argument("--optimal", action="store_true",
+                              help="also check the moves are the optimal solution")
+    verifyParser.set_defaults(func=verify)
+
+    args = parser.parse_args(argv)
+    if args.command == "array" and args.start == args.end:
+        parser.error("start and end rods must differ")
+    if args.command == "export":
+        if args.end is None:
+            args.end = args.rods
+        if args.start == args.end or max(args.start, args.end) > args.rods:
+            parser.error("start and end rods must differ and be at most --rods")
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
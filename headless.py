@@ -0,0 +1,59 @@
+import argparse
+import sys
+import time
+from HanoiSimulation import HanoiSimulation
+
+# Runs the animation logic without a window or GL context, stepping frames as fast as
+# possible and reporting the throughput, e.g.
+#   python headless.py --rings 10 --speed 1000
+#   python headless.py --rings 20 --turbo --frames 600
+#   python headless.py solution.hmv --duration 60
+
+
+def run(sim, frameDt, maxFrames=None):
+    # Plays until the solution finishes or maxFrames frames have been simulated, returns
+    # the number of frames and the wall clock time taken
+    sim.seek(0)
+    sim.playing = True
+    frames = 0
+    startTime = time.perf_counter()
+    while sim.playing and (maxFrames is None or frames < maxFrames):
+        sim.update(frameDt)
+        frames += 1
+    return frames, time.perf_counter() - startTime
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Towers of Hanoi animation without rendering")
+    parser.add_argument("file", nargs="?", help="move file to play instead of solving")
+    parser.add_argument("--rings", type=int, default=5)
+    parser.add_argument("--rods", type=int, default=3)
+    parser.add_argument("--fps", type=float, default=60.0, help="simulated frame rate")
+    parser.add_argument("--frames", type=int, help="stop after this many frames")
+    parser.add_argument("--speed", type=float, help="playback speed multiplier")
+    parser.add_argument("--duration", type=float, help="pick the speed to play the solution in this many seconds")
+    parser.add_argument("--turbo", action="store_true", help="commit a batch of moves every frame, showing the next one in flight")
+    parser.add_argument("--turbo-moves", type=int, help="moves committed per frame in turbo")
+    args = parser.parse_args(argv)
+    if args.rings < 1:
+        parser.error("at least 1 ring is needed")
+    if args.rods < 3:
+        parser.error("at least 3 rods are needed")
+
+    sim = HanoiSimulation(args.rings, args.rods, args.file, args.duration)
+    if args.speed:
+        sim.speed = min(max(args.speed, sim.minSpeed), sim.maxSpeed)
+    sim.turbo = args.turbo
+    if args.turbo_moves:
+        sim.turboMoves = args.turbo_moves
+
+    frames, elapsed = run(sim, 1 / args.fps, args.frames)
+    elapsed = max(elapsed, 1e-9)
+    print("%s rings, %s rods: %s of %s moves in %s frames (%.2fs simulated at %sx speed)" %
+          (sim.numRings, sim.numRods, sim.moveIndex, sim.numMoves, frames, frames / args.fps, sim.speed))
+    print("%.2fs wall clock, %.0f moves/s, %.0f frames/s" % (elapsed, sim.moveIndex / elapsed, frames / elapsed))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
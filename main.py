@@ -2,36 +2,32 @@
 from SkyBox import SkyBox
 import glfw
 from Camera import Camera, CameraMovement
-from LightSource import LightSource
+from LightSource import LightSource, LightSourceGroup
 from Texture import Texture
 from ctypes import c_float, c_void_p
 from OpenGL.GL import *
 import ObjModel as Obj
+from InstancedModel import InstancedModel
+from Mesh import Mesh
 
 from lab_utils import Mat3, inverse, length, make_perspective, make_rotation_x, make_rotation_y, make_rotation_z, normalize, transpose, vec3, Mat4, make_lookAt, make_scale, make_translation
 
 from Shader import Shader
+from UniformBuffer import FrameConstants, Lights
+from RenderQueue import GLStateCache, RenderQueue
+from Frustum import FrustumCuller
+from FrameStewart import FrameStewartTable, defaultTableFile
+from HanoiSimulation import HanoiSimulation, ROD_MODEL, ROD_SCALE, TABLE_MODEL, getRingModel
 from Window import Window
 # import imgui
 # from imgui.integrations.glfw import GlfwRenderer
 from math import radians, sin, cos, pi
-
-
-def solveHanoi(n, start, end, moves=[]):
-    if n == 1:
-        moves.append((start, end))
-    else:
-        # rods labelled 1, 2, 3. 1 + 2 + 3 = 6
-        # assumed start != end, so to get other rod
-        other = 6 - (start + end)
-        solveHanoi(n-1, start, other, moves)
-        moves.append((start, end))
-        solveHanoi(n-1, other, end, moves)
+import sys
 
 
 class Hanoi:
 
-    def __init__(self, width=800, height=800, numRings=5):
+    def __init__(self, width=800, height=800, numRings=5, numRods=3, moveFile=None, playbackDuration=None):
         self.window = Window(width, height, "Towers of Hanoi", render=self.render,
                              initResources=self.initResources, processInput=self.processInput)
         # Capture the mosuse
@@ -57,22 +53,20 @@ class Hanoi:
         self.pointLights = []
         self.camera = Camera(vec3(-5, 2.5, 0), yawDeg=0)
 
-        self.numRings = numRings
-
-        # playing animation
-        self.playing = False
+        # Puzzle state, move scheduling and ring kinematics, the renderer just draws its rings
+        self.sim = HanoiSimulation(numRings, numRods, moveFile, playbackDuration,
+                                   frameStewart=FrameStewartTable(defaultTableFile(), autoSave=True))
         self.justStopped = False
-        # Store solution permanently, so we can restart move animation
-        self.solution = []
-
-        # Chagne rate of animation updates
-        self.ticks = 0
-        # To be modified as animation plays
-
-        solveHanoi(numRings, 1, 3, self.solution)
-        self.moves = []
+        self.justTurbo = False
+        # Keys held down, so timeline controls only trigger once per key press
+        self.keysHeld = set()
 
         self.skybox = SkyBox('textures/skybox/')
+        # Every draw of a frame is queued, then sorted by state and submitted through the cache
+        self.renderQueue = RenderQueue()
+        self.glState = GLStateCache()
+        # Objects out of the camera's view are left out of the queue
+        self.culler = FrustumCuller()
 
     def processInput(self):
         if (glfw.get_key(self.window._win, glfw.KEY_ESCAPE) == glfw.PRESS):
@@ -94,11 +88,52 @@ class Hanoi:
             self.justChanged = False
         if(glfw.get_key(self.window._win, glfw.KEY_P) == glfw.PRESS):
             if not self.justStopped:
-                self.playing = not self.playing
+                self.sim.togglePlaying()
                 self.justStopped = True
         if(glfw.get_key(self.window._win, glfw.KEY_P) == glfw.RELEASE):
             self.justStopped = False
 
+        if(glfw.get_key(self.window._win, glfw.KEY_T) == glfw.PRESS):
+            if not self.justTurbo:
+                self.sim.turbo = not self.sim.turbo
+                self.justTurbo = True
+        if(glfw.get_key(self.window._win, glfw.KEY_T) == glfw.RELEASE):
+            self.justTurbo = False
+
+        # Timeline controls
+        sim = self.sim
+        if self.keyPressed(glfw.KEY_RIGHT):
+            sim.stepForward()
+        if self.keyPressed(glfw.KEY_LEFT):
+            sim.stepBack()
+        if self.keyPressed(glfw.KEY_HOME):
+            sim.seek(0)
+        if self.keyPressed(glfw.KEY_END):
+            sim.seek(sim.numMoves)
+        if self.keyPressed(glfw.KEY_PAGE_UP):
+            sim.scrub(sim.getTimelinePosition() + 0.1)
+        if self.keyPressed(glfw.KEY_PAGE_DOWN):
+            sim.scrub(sim.getTimelinePosition() - 0.1)
+        # Playback speed
+        if self.keyPressed(glfw.KEY_EQUAL):
+            sim.speed = min(sim.speed * 2, sim.maxSpeed)
+        if self.keyPressed(glfw.KEY_MINUS):
+            sim.speed = max(sim.speed / 2, sim.minSpeed)
+        # State changes and culling of the last frame
+        if self.keyPressed(glfw.KEY_I):
+            print(self.glState.report())
+            print(self.culler.report())
+
+    def keyPressed(self, key):
+        # True only on the frame the key goes down, holding it down doesn't repeat
+        if glfw.get_key(self.window._win, key) == glfw.PRESS:
+            if key in self.keysHeld:
+                return False
+            self.keysHeld.add(key)
+            return True
+        self.keysHeld.discard(key)
+        return False
+
     def mouseCallback(self, window, xPos, yPos):
         if (self.firstMouse):
             self.lastX = xPos
@@ -127,154 +162,60 @@ class Hanoi:
         self.shader = Shader(vertFile='shaders/lightVert.glsl',
                              fragFile='shaders/lightFrag.glsl')
 
-        # Constant Unifroms are set here
-        # If a uniform can change, it's set in render
-        self.shader.setUniform("spotLight.ambient", vec3(0.0))
-        self.shader.setUniform("spotLight.diffuse", vec3(1.0))
-        self.shader.setUniform("spotLight.specular", vec3(1.0))
-        self.shader.setUniform("spotLight.constant", 1.0)
-        self.shader.setUniform("spotLight.linear", 0.09)
-        self.shader.setUniform("spotLight.quadratic", 0.032)
-        self.shader.setUniform("spotLight.cutOff", cos(radians(12.5)))
-        self.shader.setUniform("spotLight.outerCutOff", cos(radians(15.0)))
-        self.shader.setUniform("spotLight.on", self.spotLight)  # Will change, but needs initialisation
-        # self.shader.setUniform("material.shininess", 32.0)
+        # Camera and lights are shared by every shader through uniform buffers, only
+        # uploaded when something in them changes
+        self.frameConstants = FrameConstants()
+        self.lights = Lights()
+
+        # Constant lights are set here
+        # If a light can change, it's set in render
+        self.lights.setSpotLight(ambient=vec3(0.0), diffuse=vec3(1.0), specular=vec3(1.0),
+                                 constant=1.0, linear=0.09, quadratic=0.032,
+                                 cutOff=cos(radians(12.5)), outerCutOff=cos(radians(15.0)))
+        self.lights.setSpotLightOn(self.spotLight)
 
         # Directional light
-        self.shader.setUniform("dirLight.direction", vec3(-0.2, -1.0, -0.3))
-        self.shader.setUniform("dirLight.ambient", vec3(0.25))
-        self.shader.setUniform("dirLight.diffuse", vec3(0.4))
-        self.shader.setUniform("dirLight.specular", vec3(0.5))
+        self.lights.setDirLight(direction=vec3(-0.2, -1.0, -0.3), ambient=vec3(0.25),
+                                diffuse=vec3(0.4), specular=vec3(0.5))
+
+        self.pointLights.append(LightSource(vec3(1.0, 0.5, 3.0), vec3(0.83, 0.98, 1.0)))
+        self.pointLights.append(LightSource(vec3(0.0, 3.0, 0.0), vec3(0.25, 0.25, 1.0)))
+        self.pointLights.append(LightSource(vec3(-0.2, -2, -1.5), vec3(1.0, 0.3, 0.11)))
+        self.pointLights.append(LightSource(vec3(2.0, 3, -3.0), vec3(0.25, 1.0, 0.11)))
 
-        self.pointLights.append(LightSource(vec3(1.0, 0.5, 3.0), None, vec3(0.83, 0.98, 1.0)))
-        self.pointLights.append(LightSource(vec3(0.0, 3.0, 0.0), None, vec3(0.25, 0.25, 1.0)))
-        self.pointLights.append(LightSource(vec3(-0.2, -2, -1.5), None, vec3(1.0, 0.3, 0.11)))
-        self.pointLights.append(LightSource(vec3(2.0, 3, -3.0), None, vec3(0.25, 1.0, 0.11)))
+        # The point lights don't move, so they are only written once
+        for i, light in enumerate(self.pointLights):
+            self.lights.setPointLight(i, light.position, ambient=vec3(0.2)*light.colour,
+                                      diffuse=vec3(0.8)*light.colour, specular=vec3(1.0)*light.colour,
+                                      constant=1.0, linear=0.09, quadratic=0.032)
 
         self.objects = []
 
-        self.table = Obj.ObjModel('objects/table.obj', self.shader)
-
-        self.rods = []
-        for i in range(3):
-            rod = Obj.ObjModel('objects/rod.obj', self.shader, scale=vec3(2))
-            rod.position = vec3(0.0, self.table.height, -1.0 + i)
-            self.rods.append((rod, []))
-            self.table.addChild(rod)
-
-        prevPos = self.rods[0][0].position.copy()
-        for i in range(self.numRings):
-            if i % 2:
-                torus = Obj.ObjModel('objects/torus.obj', self.shader, scale=(1-i/10))
-            else:
-                torus = Obj.ObjModel('objects/metal_torus.obj', self.shader, scale=(1-i/10))
-            if i == 0:
-                torus.position = prevPos
-            else:
-                torus.position = prevPos + vec3(0.0, torus.height, 0.0)
-            prevPos = torus.position
-            self.objects.append(torus)
-            self.rods[0][1].append(torus)
+        # The whole scene shares the simulation's transform store
+        transforms = self.sim.transforms
+        self.table = Obj.ObjModel(TABLE_MODEL, self.shader, transforms=transforms)
+
+        # Rods and rings are drawn instanced, with one draw per mesh however many rings there
+        # are. Meshes are loaded once and shared, the copies are just entities in the transform store
+        self.instancedShader = Shader(vertFile='shaders/lightInstancedVert.glsl',
+                                      fragFile='shaders/lightFrag.glsl')
+        self.rods = transforms.addMany(self.sim.numRods, scale=ROD_SCALE)
+        transforms.positions[self.rods] = self.sim.rodPositions
+        self.instanced = [InstancedModel(Mesh.acquire(ROD_MODEL), self.instancedShader, transforms,
+                                         range(self.rods.start, self.rods.stop))]
+
+        # Rings from largest to smallest, using the transforms the simulation moves them with,
+        # grouped by the mesh they use
+        ringMeshes = {}
+        for i in range(self.sim.numRings):
+            ringMeshes.setdefault(getRingModel(i), []).append(self.sim.ringSlice.start + i)
+        for fileName, indices in ringMeshes.items():
+            self.instanced.append(InstancedModel(Mesh.acquire(fileName), self.instancedShader, transforms, indices))
         self.objects.append(self.table)
-        self.activeRing = None
+        self.lightCubes = LightSourceGroup(self.pointLights)
         # For wireframe
         # glPolygonMode(GL_FRONT_AND_BACK, GL_LINE)
 
-        self.genMoves()
-        self.moves = list(reversed(self.moves))
-        self.currentMove = self.getNextMove()
-
-    def genMoves(self):
-        # moves is a stack, so first in last out
-        # each move has 3 steps:
-        #   lift off pole
-        #   move to destination
-        #   lower onto pole
-
-        # Copy list of rings on rods
-        # Leave class state the same, so we don't have to reset
-        rods = [self.rods[i][1].copy() for i in range(3)]
-
-        for step in self.solution:
-            start, end = step
-            maxHeight = 2
-
-            obj = rods[start-1].pop()
-
-            def createCallback(startRod, endRod):
-                def onComplete():
-                    self.rods[endRod][1].append(self.rods[startRod][1].pop())
-                return onComplete
-
-            def nothingCallback():
-                pass
-
-            endHeight = sum(t.height for t in rods[end-1])
-            endRodPos = self.rods[end-1][0].position.copy()
-            startRodPos = self.rods[start-1][0].position.copy()
-            moveUp = {
-                "obj": obj,
-                "target": startRodPos + vec3(0, maxHeight-endRodPos[1], 0),
-                "start": start,
-                "end": end,
-                "complete": False,
-                "onComplete": nothingCallback
-            }
-
-            move = {
-                "obj": obj,
-                "target": endRodPos + vec3(0, maxHeight-endRodPos[1], 0),
-                "start": start,
-                "end": end,
-                "complete": False,
-                "onComplete": nothingCallback
-            }
-
-            moveDown = {
-                "obj": obj,
-                "target": endRodPos + vec3(0, endHeight, 0),
-                "start": start,
-                "end": end,
-                "complete": False,
-                "onComplete": createCallback(start-1, end-1)
-            }
-            rods[end-1].append(obj)
-            self.moves.append(moveUp)
-            self.moves.append(move)
-            self.moves.append(moveDown)
-
-    def resetRods(self):
-        # Called when animation complete
-        # All rings on rod 3 Need to move to rod 1
-        for i in range(len(self.rods[2][1])):
-            self.rods[0][1].append(self.rods[2][1].pop(0))
-
-    def getNextMove(self):
-        if len(self.moves) == 0:
-            # Updates self.moves
-            self.resetRods()
-            self.genMoves()
-            return None
-        return self.moves.pop()
-
-    def playMove(self, dt):
-        if self.currentMove is None:
-            return
-        elif self.currentMove["complete"]:
-            self.currentMove = self.getNextMove()
-            return
-
-        obj = self.currentMove["obj"]
-        target = self.currentMove["target"]
-        startRod = self.currentMove["start"]-1
-        endRod = self.currentMove["end"]-1
-        direction = normalize(target - obj.position)
-        obj.position += dt * direction
-        if (length(target - obj.position) <= 0.02):
-            obj.position = target
-            self.currentMove["onComplete"]()
-            self.currentMove["complete"] = True
-
     def render(self, width, height):
         currentFrame = glfw.get_time()
         self.deltaTime = currentFrame - self.lastFrame
@@ -285,53 +226,45 @@ class Hanoi:
         glClear(GL_DEPTH_BUFFER_BIT | GL_COLOR_BUFFER_BIT)
 
         # Calculate transformation matrices
-        model = Mat4()
         view = self.camera.getViewMatrix()
         projection = make_perspective(self.camera.zoom, width/height, 0.1, 100)
 
-        self.shader.use()
-        self.shader.setUniform("model", model)
-        self.shader.setUniform("normalMat", Mat3(transpose(inverse(model))))
-        self.shader.setUniform("view", view)
-        self.shader.setUniform("projection", projection)
-        self.shader.setUniform("viewPos", self.camera.position)
-
-        # Point lights
-        for i in range(len(self.pointLights)):
-            light = self.pointLights[i]
-            self.shader.setUniform("pointLights[%s].position" % i, light.position)
-            self.shader.setUniform("pointLights[%s].ambient" % i, vec3(0.2)*light.colour)
-            self.shader.setUniform("pointLights[%s].diffuse" % i, vec3(0.8)*light.colour)
-            self.shader.setUniform("pointLights[%s].specular" % i, vec3(1.0)*light.colour)
-            self.shader.setUniform("pointLights[%s].constant" % i, 1.0)
-            self.shader.setUniform("pointLights[%s].linear" % i, 0.09)
-            self.shader.setUniform("pointLights[%s].quadratic" % i, 0.032)
-
-            light.draw(projection, view)
-
+        self.frameConstants.setCamera(view, projection, self.camera.position)
         # Spotlight
         if (self.spotLight):
-            self.shader.setUniform("spotLight.position", self.camera.position)
-            self.shader.setUniform("spotLight.direction", self.camera.front)
-
-        # Only update uniform when needed
-        if self.justChanged:
-            self.shader.setUniform("spotLight.on", self.spotLight)
+            self.lights.setSpotLightPose(self.camera.position, self.camera.front)
+        self.lights.setSpotLightOn(self.spotLight)
+        # Only the ranges that changed are uploaded
+        self.frameConstants.upload()
+        self.lights.upload()
+
+        self.sim.update(self.deltaTime)
+        # The model matrices of whatever moved in one pass, then the models' cached world
+        # matrices, only recomputed where they depend on something that moved
+        self.sim.transforms.updateMatrices()
+        for obj in self.objects:
+            obj.updateWorldMatrix()
 
-        if self.playing:
-            if self.ticks == 0:
-                self.playMove(self.deltaTime)
-                self.ticks = 0
-            else:
-                self.ticks += 1
+        # Culled against the same camera, all the models' bounds in one batch
+        self.culler.resetCounts()
+        self.culler.setViewProjection((projection * view).getData())
+        self.culler.cullModels(self.objects)
 
+        self.lightCubes.queue(self.renderQueue)
         for obj in self.objects:
-            obj.render(transforms={"view": view, "projection": projection})
+            obj.queue(self.renderQueue)
+        for obj in self.instanced:
+            obj.queue(self.renderQueue, self.culler)
+        # The skybox is in a later layer, so it still renders last
+        self.skybox.queue(self.renderQueue)
 
-        # Render cubemap/skybox last
-        self.skybox.draw(view, projection)
+        # Nothing else binds VAOs or textures between frames, but start clean in case
+        self.glState.invalidate()
+        self.glState.resetCounts()
+        self.renderQueue.flush(self.glState)
 
 
 if __name__ == "__main__":
-    project = Hanoi(numRings=2)
+    # Optionally play a move file written by export.py
+    project = Hanoi(numRings=2, moveFile=sys.argv[1] if len(sys.argv) > 1 else None)
     project.start()
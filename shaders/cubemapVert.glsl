@@ -3,8 +3,13 @@ layout (location = 0) in vec3 aPos;
 
 out vec3 TexCoords;
 
-uniform mat4 projection;
-uniform mat4 view;
+// Camera, shared by every program through a uniform buffer updated once per frame
+layout(std140) uniform FrameConstants {
+    mat4 view;
+    mat4 projection;
+    vec3 viewPos;
+};
+
 uniform mat4 model;
 
 void main() {
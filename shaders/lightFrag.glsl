@@ -1,17 +1,22 @@
 #version 330 core
 
-struct Material {
+// Material properties uniform buffer, filled and bound per material by ObjModel (std140, so
+// each float packs into the padding after a vec3)
+layout(std140) uniform MaterialProperties {
     vec3 diffuse_colour;
+    float alpha;
     vec3 specular_colour;
-    vec3 emissive_colour;
     float specular_exponent;
-    sampler2D diffuse_texture;
-    sampler2D opacity_texture;
-    sampler2D specular_texture;
-    sampler2D normal_texture;
-    float alpha;
-};
+    vec3 emissive_colour;
+} material;
+
+// Textures set by ObjModel, bound to their texture units by ObjModel.setDefaultUniformBindings
+uniform sampler2D diffuse_texture;
+uniform sampler2D opacity_texture;
+uniform sampler2D specular_texture;
+uniform sampler2D normal_texture;
 
+// Light structs are laid out for std140, each float fills the padding after a vec3
 struct DirLight {
     vec3 direction;
 
@@ -22,32 +27,30 @@ struct DirLight {
 
 struct PointLight {
     vec3 position;
-
     float constant;
-    float linear;
-    float quadratic;
 
     vec3 ambient;
+    float linear;
     vec3 diffuse;
+    float quadratic;
     vec3 specular;
 };
 
 
 struct SpotLight {
     vec3 position;
-    vec3 direction;
     float cutOff;
+    vec3 direction;
     float outerCutOff;
-    
-    int on;
-    
+
+    vec3 ambient;
     float constant;
+    vec3 diffuse;
     float linear;
+    vec3 specular;
     float quadratic;
-  
-    vec3 ambient;
-    vec3 diffuse;
-    vec3 specular;       
+
+    int on;
 };
 
 
@@ -64,17 +67,24 @@ in vec2 TexCoords;
 
 
 #define NR_POINT_LIGHTS 4
-uniform PointLight pointLights[NR_POINT_LIGHTS];
-uniform SpotLight spotLight;
-uniform DirLight dirLight;
+// Every light in one uniform buffer, only uploaded when a light changes
+layout(std140) uniform Lights {
+    PointLight pointLights[NR_POINT_LIGHTS];
+    SpotLight spotLight;
+    DirLight dirLight;
+};
 
-uniform vec3 viewPos;
-uniform Material material;
+// Camera, shared by every program through a uniform buffer updated once per frame
+layout(std140) uniform FrameConstants {
+    mat4 view;
+    mat4 projection;
+    vec3 viewPos;
+};
 
 
 
 void main() {
-    //if (texture(material.opacity_texture, TexCoords).r < 0.5)	{
+    //if (texture(opacity_texture, TexCoords).r < 0.5)	{
 	//	discard;
 	//}
 
@@ -104,9 +114,9 @@ vec3 calcDirLight(DirLight light, vec3 normal, vec3 viewDir) {
     float diff = max(dot(normal, lightDir), 0.0);
     vec3 reflectDir = reflect(-lightDir, normal);
     float spec = pow(max(dot(viewDir, reflectDir), 0.0), material.specular_exponent);
-    vec3 ambient = light.ambient * vec3(texture(material.diffuse_texture, TexCoords))  * material.diffuse_colour;
-    vec3 diffuse = light.diffuse * diff * vec3(texture(material.diffuse_texture, TexCoords)) * material.diffuse_colour;
-    vec3 specular = light.specular * spec * vec3(texture(material.specular_texture, TexCoords))  * material.diffuse_colour;
+    vec3 ambient = light.ambient * vec3(texture(diffuse_texture, TexCoords))  * material.diffuse_colour;
+    vec3 diffuse = light.diffuse * diff * vec3(texture(diffuse_texture, TexCoords)) * material.diffuse_colour;
+    vec3 specular = light.specular * spec * vec3(texture(specular_texture, TexCoords))  * material.diffuse_colour;
     return ambient + diffuse + specular;
 }
 
@@ -123,9 +133,9 @@ vec3 calcPointLight(PointLight light, vec3 normal, vec3 fragPos, vec3 viewDir)
     float attenuation = 1.0 / (light.constant + light.linear * distance + 
   			     light.quadratic * (distance * distance));    
     // combine results
-    vec3 ambient  = light.ambient  * vec3(texture(material.diffuse_texture, TexCoords));
-    vec3 diffuse  = light.diffuse  * diff * vec3(texture(material.diffuse_texture, TexCoords));
-    vec3 specular = light.specular * spec * vec3(texture(material.specular_texture, TexCoords));
+    vec3 ambient  = light.ambient  * vec3(texture(diffuse_texture, TexCoords));
+    vec3 diffuse  = light.diffuse  * diff * vec3(texture(diffuse_texture, TexCoords));
+    vec3 specular = light.specular * spec * vec3(texture(specular_texture, TexCoords));
     ambient  *= attenuation;
     diffuse  *= attenuation;
     specular *= attenuation;
@@ -149,9 +159,9 @@ vec3 calcSpotLight(SpotLight light, vec3 normal, vec3 fragPos, vec3 viewDir)
     float epsilon = light.cutOff - light.outerCutOff;
     float intensity = clamp((theta - light.outerCutOff) / epsilon, 0.0, 1.0);
     // combine results
-    vec3 ambient = light.ambient * vec3(texture(material.diffuse_texture, TexCoords));
-    vec3 diffuse = light.diffuse * diff * vec3(texture(material.diffuse_texture, TexCoords));
-    vec3 specular = light.specular * spec * vec3(texture(material.specular_texture, TexCoords));
+    vec3 ambient = light.ambient * vec3(texture(diffuse_texture, TexCoords));
+    vec3 diffuse = light.diffuse * diff * vec3(texture(diffuse_texture, TexCoords));
+    vec3 specular = light.specular * spec * vec3(texture(specular_texture, TexCoords));
     ambient *= attenuation * intensity;
     diffuse *= attenuation * intensity;
     specular *= attenuation * intensity;
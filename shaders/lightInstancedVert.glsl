@@ -0,0 +1,25 @@
+#version 330 core
+layout (location = 0) in vec3 aPos;
+layout (location = 1) in vec3 aNormal;
+layout (location = 2) in vec2 aTexCoords;
+// Per instance transforms, from InstancedModel
+layout (location = 5) in mat4 instanceModel;
+layout (location = 9) in mat3 instanceNormalMat;
+
+// Camera, shared by every program through a uniform buffer updated once per frame
+layout(std140) uniform FrameConstants {
+    mat4 view;
+    mat4 projection;
+    vec3 viewPos;
+};
+
+out vec3 Normal;
+out vec3 FragPos;
+out vec2 TexCoords;
+
+void main() {
+    Normal = instanceNormalMat * aNormal;
+    FragPos = vec3(instanceModel * vec4(aPos, 1.0));
+    TexCoords = aTexCoords;
+    gl_Position = projection * view * vec4(FragPos, 1.0);
+}
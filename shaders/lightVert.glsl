@@ -3,9 +3,14 @@ layout (location = 0) in vec3 aPos;
 layout (location = 1) in vec3 aNormal;
 layout (location = 2) in vec2 aTexCoords;
 
+// Camera, shared by every program through a uniform buffer updated once per frame
+layout(std140) uniform FrameConstants {
+    mat4 view;
+    mat4 projection;
+    vec3 viewPos;
+};
+
 uniform mat4 model;
-uniform mat4 view;
-uniform mat4 projection;
 uniform mat3 normalMat;
 
 out vec3 Normal;
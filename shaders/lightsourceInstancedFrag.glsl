@@ -0,0 +1,8 @@
+#version 330 core
+out vec4 FragColour;
+
+in vec3 LightColour;
+
+void main() {
+    FragColour = vec4(LightColour, 1.0);
+}
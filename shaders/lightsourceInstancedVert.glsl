@@ -0,0 +1,21 @@
+#version 330 core
+layout (location = 0) in vec3 aPos;
+// Per instance light position and colour, from LightSourceGroup
+layout (location = 1) in vec3 instancePosition;
+layout (location = 2) in vec3 instanceColour;
+
+// Camera, shared by every program through a uniform buffer updated once per frame
+layout(std140) uniform FrameConstants {
+    mat4 view;
+    mat4 projection;
+    vec3 viewPos;
+};
+
+uniform float scale;
+
+out vec3 LightColour;
+
+void main() {
+    LightColour = instanceColour;
+    gl_Position = projection * view * vec4(aPos * scale + instancePosition, 1.0);
+}
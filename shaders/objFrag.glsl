@@ -7,13 +7,13 @@ in VertexData
 };
 
 // Material properties uniform buffer, required by OBJModel.
-struct Material {
+layout(std140) uniform MaterialProperties {
     vec3 diffuse_colour;
     float alpha;
     vec3 specular_colour;
-    vec3 emissive_colour;
     float specular_exponent;
-};
+    vec3 emissive_colour;
+} material;
 
 // Textures set by OBJModel (names must be bound to the right texture unit, OBJModel::setDefaultUniformBindings helps with that.
 uniform sampler2D diffuse_texture;
@@ -23,7 +23,6 @@ uniform sampler2D normal_texture;
 
 // Other uniforms used by the shader
 uniform vec3 viewSpaceLightDirection;
-uniform Material material;
 
 out vec4 fragmentcolour;
 
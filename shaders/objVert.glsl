@@ -10,9 +10,14 @@ out VertexData {
 	vec2 v2f_texCoord;
 };
 
+// Camera, shared by every program through a uniform buffer updated once per frame
+layout(std140) uniform FrameConstants {
+    mat4 view;
+    mat4 projection;
+    vec3 viewPos;
+};
+
 uniform mat4 model;
-uniform mat4 view;
-uniform mat4 projection;
 uniform mat3 normalMat;
 
 //uniform mat3 modelToViewNormalTransform;
@@ -0,0 +1,13 @@
+import os
+import sys
+import pytest
+
+# The modules live at the top of the repository, and the simulation reads its model bounds
+# from paths relative to it
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(autouse=True)
+def repositoryDir(monkeypatch):
+    monkeypatch.chdir(ROOT)
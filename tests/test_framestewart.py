@@ -0,0 +1,75 @@
+from collections import deque
+from itertools import product
+import pytest
+from FrameStewart import FrameStewartTable, solveFrameStewart
+from RodState import RodState
+
+
+def shortestSolution(numRings, numRods):
+    # Breadth first search over every configuration, for small puzzles
+    start = tuple(RodState.start(numRings, numRods).rods)
+    goal = tuple(RodState.start(numRings, numRods, numRods).rods)
+    distances = {start: 0}
+    queue = deque([start])
+    while queue:
+        rods = queue.popleft()
+        if rods == goal:
+            return distances[rods]
+        state = RodState(rods)
+        for a, b in product(range(1, numRods + 1), repeat=2):
+            if state.canMove(a, b):
+                nextState = state.copy()
+                nextState.move(a, b)
+                key = tuple(nextState.rods)
+                if key not in distances:
+                    distances[key] = distances[rods] + 1
+                    queue.append(key)
+
+
+@pytest.mark.parametrize("numRods,maxRings", [(4, 6), (5, 5)])
+def test_movesAreOptimalForSmallPuzzles(numRods, maxRings):
+    table = FrameStewartTable()
+    for numRings in range(1, maxRings + 1):
+        assert table.numMoves(numRings, numRods) == shortestSolution(numRings, numRods)
+
+
+def test_knownMoveCounts():
+    table = FrameStewartTable()
+    assert [table.numMoves(n, 4) for n in range(1, 11)] == [1, 3, 5, 9, 13, 17, 25, 33, 41, 49]
+    assert [table.numMoves(n, 3) for n in range(1, 6)] == [1, 3, 7, 15, 31]
+
+
+@pytest.mark.parametrize("numRings,numRods,start,end", [(8, 4, 1, 4), (7, 4, 3, 2), (9, 5, 1, 5), (6, 6, 2, 1)])
+def test_solutionIsLegalAndComplete(numRings, numRods, start, end):
+    table = FrameStewartTable()
+    state = RodState.start(numRings, numRods, start)
+    count = 0
+    for move in solveFrameStewart(numRings, numRods, start, end, table):
+        state.move(*move)
+        count += 1
+    assert state == RodState.start(numRings, numRods, end)
+    assert count == table.numMoves(numRings, numRods)
+
+
+def test_saveAndLoad(tmp_path):
+    fileName = str(tmp_path / "cache" / "frame_stewart.json")
+    table = FrameStewartTable(fileName)
+    table.numMoves(12, 5)
+    # Nothing is written without autoSave
+    assert not (tmp_path / "cache").exists()
+    table.save()
+    assert FrameStewartTable(fileName).table == table.table
+
+    saving = FrameStewartTable(str(tmp_path / "auto.json"), autoSave=True)
+    saving.numMoves(6, 4)
+    assert FrameStewartTable(str(tmp_path / "auto.json")).table == saving.table
+
+
+@pytest.mark.parametrize("contents", ['{"2,4": [3', '[1, 2]', '{"2,4": 3}', '{"x": [1, 2]}', '{"2,4": [3, 1, 5]}'])
+def test_unreadableFileStartsEmpty(tmp_path, capsys, contents):
+    fileName = tmp_path / "frame_stewart.json"
+    fileName.write_text(contents)
+    table = FrameStewartTable(str(fileName))
+    assert table.table == {}
+    assert "WARNING" in capsys.readouterr().out
+    assert table.numMoves(5, 4) == 13
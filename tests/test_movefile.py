@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+from HanoiSolver import encodeMove, solveHanoi, solveHanoiArray
+from MoveFile import HEADER, MoveFileReader, MoveFileWriter, exportHanoi, packMoves, unpackMoves
+
+
+def test_packRoundTrip():
+    codes = np.random.default_rng(0).integers(0, 16, 1000, dtype=np.uint8)
+    packed = packMoves(codes)
+    assert len(packed) == 500
+    # Even moves in the low nibble
+    assert packed[0] == codes[0] | (codes[1] << 4)
+    assert np.array_equal(unpackMoves(packed), codes)
+
+
+def test_writerAndReaderAgree(tmp_path):
+    fileName = str(tmp_path / "moves.hmv")
+    moves = [(a, b) for a in range(1, 5) for b in range(1, 5) if a != b] * 5
+    codes = [encodeMove(a, b) for a, b in moves]
+    # Odd sized pieces, so codes are left waiting for a partner between writes
+    with MoveFileWriter(fileName, 6, 4, 1, 4) as writer:
+        writer.write(*moves[0])
+        writer.writeCodes(codes[1:8])
+        writer.writeMoves(moves[8:21], chunkSize=4)
+        writer.writeCodes(codes[21:])
+
+    with MoveFileReader(fileName) as reader:
+        assert (reader.numRings, reader.numRods, reader.start, reader.end) == (6, 4, 1, 4)
+        assert len(reader) == len(moves)
+        assert not reader.optimal
+        assert reader.verify()
+        assert [reader[k] for k in range(len(moves))] == moves
+        assert reader[-1] == moves[-1]
+        assert list(reader.iterMoves(3, chunkSize=5)) == moves[3:]
+        for first in range(len(codes)):
+            for count in (0, 1, 2, 5):
+                if first + count <= len(codes):
+                    assert reader.getCodes(first, count).tolist() == codes[first:first + count]
+        with pytest.raises(IndexError):
+            reader[len(moves)]
+
+
+def test_corruptFiles(tmp_path):
+    fileName = tmp_path / "moves.hmv"
+    with MoveFileWriter(str(fileName), 3) as writer:
+        writer.writeMoves(solveHanoi(3))
+    data = bytearray(fileName.read_bytes())
+
+    data[-1] ^= 0x10
+    fileName.write_bytes(bytes(data))
+    with MoveFileReader(str(fileName)) as reader:
+        assert not reader.verify()
+
+    fileName.write_bytes(bytes(data[:-1]))
+    with pytest.raises(ValueError):
+        MoveFileReader(str(fileName))
+
+
+def test_optimalFlag(tmp_path):
+    fileName = tmp_path / "optimal.hmv"
+    exportHanoi(str(fileName), 9, 2, 1, chunkSize=100)
+    with MoveFileReader(str(fileName)) as reader:
+        assert reader.optimal
+        assert reader.findNonOptimalMove(chunkSize=64) == -1
+        assert np.array_equal(reader.getCodes(), solveHanoiArray(9, 2, 1))
+
+    # Version 1 files had padding where the flags are, so they load as not optimal
+    data = bytearray(fileName.read_bytes())
+    data[4] = 1
+    data[9] = 0
+    fileName.write_bytes(bytes(data))
+    with MoveFileReader(str(fileName)) as reader:
+        assert not reader.optimal
+        assert reader.verify()
+
+
+def test_findNonOptimalMove(tmp_path):
+    fileName = str(tmp_path / "moves.hmv")
+    moves = list(solveHanoi(5))
+    with MoveFileWriter(fileName, 5) as writer:
+        writer.writeMoves(moves[:20] + [moves[21]] + moves[21:])
+    with MoveFileReader(fileName) as reader:
+        assert reader.findNonOptimalMove(chunkSize=8) == 20
+
+    with MoveFileWriter(fileName, 5) as writer:
+        writer.writeMoves(moves[:-1])
+    with MoveFileReader(fileName) as reader:
+        assert reader.findNonOptimalMove() == len(moves) - 1
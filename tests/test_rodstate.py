@@ -0,0 +1,72 @@
+import random
+import pytest
+from FrameStewart import FrameStewartTable, solveFrameStewart
+from HanoiSolver import encodeMove, solveHanoiArray
+from RodState import RodState, validateCodes, validateMoveFile, validateMoves
+from MoveFile import MoveFileWriter, MoveFileReader
+
+
+def randomState(rng, numRings, numRods):
+    return RodState.fromConfiguration([rng.randint(1, numRods) for _ in range(numRings)], numRods)
+
+
+def randomMoves(rng, state, count, illegalChance):
+    # Legal moves from state, except that each is any other pair of rods with illegalChance
+    state = state.copy()
+    numRods = len(state.rods)
+    moves = []
+    for _ in range(count):
+        legal = [(a, b) for a in range(1, numRods + 1) for b in range(1, numRods + 1) if state.canMove(a, b)]
+        if not legal or rng.random() < illegalChance:
+            move = tuple(rng.sample(range(1, numRods + 1), 2))
+        else:
+            move = rng.choice(legal)
+        if state.canMove(*move):
+            state.move(*move)
+        moves.append(move)
+    return moves
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_validateCodesMatchesValidateMoves(seed):
+    rng = random.Random(seed)
+    numRods = rng.choice((3, 4))
+    start = randomState(rng, rng.randint(1, 9), numRods)
+    moves = randomMoves(rng, start, rng.randint(0, 300), rng.choice((0.0, 0.01, 0.1)))
+    expected = start.copy()
+    expectedIllegal = validateMoves(moves, expected)
+
+    state = start.copy()
+    illegal = validateCodes([encodeMove(a, b) for a, b in moves], state, chunkSize=rng.choice((1, 7, 64, 1 << 14)))
+    assert illegal == expectedIllegal
+    assert state == expected
+
+
+def test_validateCodesStopsAtMalformedCodes():
+    # A rod moved onto itself, and a rod past the rod count
+    for bad in ((2, 2), (1, 4)):
+        state = RodState.start(3)
+        assert validateCodes([encodeMove(1, 3), encodeMove(*bad), encodeMove(1, 2)], state, 10) == 11
+        assert state == RodState([6, 0, 1])
+
+
+def test_validateCodesAcceptsSolutions():
+    state = RodState.start(10)
+    assert validateCodes(solveHanoiArray(10), state) == -1
+    assert state == RodState.start(10, 3, 3)
+
+    table = FrameStewartTable()
+    state = RodState.start(9, 4)
+    assert validateCodes([encodeMove(a, b) for a, b in solveFrameStewart(9, 4, table=table)], state) == -1
+    assert state == RodState.start(9, 4, 4)
+
+
+def test_validateMoveFileChecksCount(tmp_path):
+    fileName = str(tmp_path / "moves.hmv")
+    with MoveFileWriter(fileName, 4) as writer:
+        writer.writeMoves([(1, 2), (1, 3), (2, 3), (1, 3)])
+    with MoveFileReader(fileName) as reader:
+        state = RodState.start(4)
+        assert validateMoveFile(reader, state, 3) == -1
+        assert state == RodState([12, 0, 3])
+        assert validateMoveFile(reader, chunkSize=1) == 3
@@ -0,0 +1,28 @@
+import numpy as np
+from FrameStewart import FrameStewartTable
+from HanoiSimulation import HanoiSimulation
+
+
+def playFrames(sim, frames, frameDt=1 / 60):
+    sim.seek(0)
+    sim.playing = True
+    for _ in range(frames):
+        sim.update(frameDt)
+
+
+def test_manyRingsHaveFiniteInstanceTransforms():
+    # The instanced rings upload these every frame, a ring scaled to nothing would show up as
+    # a non finite normal matrix
+    sim = HanoiSimulation(20, frameStewart=FrameStewartTable())
+    sim.turbo = True
+    playFrames(sim, 30)
+    sim.transforms.updateMatrices()
+    assert np.all(sim.transforms.scales[sim.ringSlice] > 0)
+    assert np.all(np.isfinite(sim.transforms.matrices[sim.ringSlice]))
+    assert np.all(np.isfinite(sim.transforms.normalMatrices[sim.ringSlice]))
+
+
+def test_liftClearsTheTallestStack():
+    for numRings in (3, 30, 100):
+        sim = HanoiSimulation(numRings, frameStewart=FrameStewartTable())
+        assert sim.liftHeight > sim.tableHeight + sim.ringHeights.sum()
@@ -0,0 +1,63 @@
+import random
+import pytest
+from HanoiSolver import (DistanceTable, decodeMove, decodeMoves, distanceFrom, encodeMove, getConfiguration,
+                         getConfigurationFrom, getMove, solveFrom, solveHanoi, solveHanoiArray)
+from RodState import RodState
+
+
+@pytest.mark.parametrize("start,end", [(1, 3), (1, 2), (3, 1), (2, 3)])
+def test_closedFormsMatchTheSolution(start, end):
+    n = 7
+    moves = list(solveHanoi(n, start, end))
+    assert len(moves) == (1 << n) - 1
+    starts, ends = decodeMoves(solveHanoiArray(n, start, end))
+    assert list(zip(starts.tolist(), ends.tolist())) == moves
+
+    state = RodState.start(n, 3, start)
+    for k, move in enumerate(moves):
+        assert getMove(n, k, start, end) == move
+        assert getConfiguration(n, k, start, end) == state.toConfiguration()
+        state.move(*move)
+    assert state == RodState.start(n, 3, end)
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_solveFromRandomConfigurations(seed):
+    rng = random.Random(seed)
+    config = [rng.randint(1, 3) for _ in range(rng.randint(0, 8))]
+    end = rng.randint(1, 3)
+    moves = list(solveFrom(config, end))
+    assert len(moves) == distanceFrom(config, end)
+
+    state = RodState.fromConfiguration(config)
+    for k, move in enumerate(moves):
+        assert getConfigurationFrom(config, k, end) == state.toConfiguration()
+        state.move(*move)
+    assert state.toConfiguration() == [end] * len(config)
+    assert getConfigurationFrom(config, len(moves), end) == [end] * len(config)
+    with pytest.raises(IndexError):
+        getConfigurationFrom(config, len(moves) + 1, end)
+
+
+def test_solveFromTheStartIsTheOptimalSolution():
+    assert list(solveFrom([1] * 6, 3)) == list(solveHanoi(6))
+
+
+def test_distanceTableMatchesDistanceFrom():
+    n = 5
+    table = DistanceTable(n)
+    for code in range(3 ** n):
+        config = [(code // 3 ** disk) % 3 + 1 for disk in range(n)]
+        assert table.encode(config) == code
+        for end in (1, 2, 3):
+            assert table.distance(code, end) == distanceFrom(config, end)
+
+
+def test_encodeMove():
+    for start in range(1, 5):
+        for end in range(1, 5):
+            assert 0 <= encodeMove(start, end) < 16
+            assert decodeMove(encodeMove(start, end)) == (start, end)
+    for start, end in ((5, 1), (1, 5), (0, 2), (2, 0)):
+        with pytest.raises(ValueError):
+            encodeMove(start, end)